@@ -0,0 +1,113 @@
+"""Local stand-in for the BoM ArcGIS gauge service, for testing the Map page.
+
+Serves ``/<layer>/query`` for any layer with synthetic gauge points spread
+over Queensland, supporting the parts of the ArcGIS REST query API the app
+uses: envelope ``geometry`` filters, ``returnCountOnly``, paging with
+``resultOffset`` / ``resultRecordCount`` (capped at ``--max-records``, with
+``exceededTransferLimit`` set on truncated pages) and ``ETag`` /
+``Last-Modified`` with 304 responses to conditional requests.
+
+Usage::
+
+    python arcgis_stub.py [--port 8765] [--count 5000] [--delay 0.2]
+    set BOM_ARCGIS_URL=http://localhost:8765
+"""
+import argparse
+import hashlib
+import json
+import random
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# lon/lat extent of the synthetic gauges
+EXTENT = (138.0, -29.0, 153.6, -10.0)
+
+
+def make_gauges(layer: int, count: int):
+    rng = random.Random(layer)
+    kind = "Rain" if layer == 4 else "River"
+    return [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [
+                round(rng.uniform(EXTENT[0], EXTENT[2]), 5), round(rng.uniform(EXTENT[1], EXTENT[3]), 5),
+            ]},
+            "properties": {"OBJECTID": i + 1, "name": f"{kind} gauge {i + 1:05d}", "station_no": f"{layer}{i + 1:06d}"},
+        }
+        for i in range(count)
+    ]
+
+
+def make_handler(count: int, max_records: int, delay: float):
+    layers = {}
+    last_modified = formatdate(time.time(), usegmt=True)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            if len(parts) < 2 or parts[-1] != "query" or not parts[-2].isdigit():
+                self.send_error(404)
+                return
+            layer = int(parts[-2])
+            gauges = layers.setdefault(layer, make_gauges(layer, count))
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+            if "geometry" in query:
+                xmin, ymin, xmax, ymax = map(float, query["geometry"].split(","))
+                gauges = [g for g in gauges
+                          if xmin <= g["geometry"]["coordinates"][0] <= xmax
+                          and ymin <= g["geometry"]["coordinates"][1] <= ymax]
+            if query.get("returnCountOnly") == "true":
+                self._send({"count": len(gauges)})
+                return
+
+            offset = int(query.get("resultOffset", 0))
+            limit = min(int(query.get("resultRecordCount", max_records)), max_records)
+            page = gauges[offset:offset + limit]
+            body = {"type": "FeatureCollection", "features": page}
+            if offset + limit < len(gauges):
+                body["properties"] = {"exceededTransferLimit": True}
+            payload = json.dumps(body).encode()
+            etag = '"%s"' % hashlib.md5(payload).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            time.sleep(delay)
+            self._send(body, payload, {"ETag": etag, "Last-Modified": last_modified})
+
+        def _send(self, body, payload=None, headers=None):
+            payload = payload or json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--count", type=int, default=5000, help="gauges per layer")
+    parser.add_argument("--max-records", type=int, default=1000, help="features per response")
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds added to each feature response")
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer(("", args.port), make_handler(args.count, args.max_records, args.delay))
+    print(f"Serving {args.count} gauges per layer on http://localhost:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Non-blocking access to the BoM flood gauge layers (river=5, rain=4).
+
+``get_gauge_layer`` never waits for the network: it returns the disk-cached
+GeoJSON together with its state, and when the copy is older than the TTL or
+missing it starts a refresh on a background thread. Layers are kept in a
+``DiskCache`` under ``.cache/gauges/`` (compressed, atomically written, LRU
+bounded by ``GAUGE_CACHE_MB``) keyed on layer and bbox; a bbox inside one
+already cached (or the whole layer) is served from that entry. Refreshes
+
+* share one pooled ``requests.Session`` (keep-alive, retries on 5xx);
+* revalidate single-page layers with ``If-None-Match`` /
+  ``If-Modified-Since`` using the validators of the previous download, so an
+  unchanged layer costs one 304 (a 304 for the first page says nothing about
+  the others, so multi-page layers are downloaded in full);
+* page large layers with ``resultOffset`` / ``resultRecordCount`` and fetch
+  the pages in parallel;
+* hold the entry's file lock, so app replicas sharing the cache volume do
+  not download the same layer at the same time: a refresh that finds the
+  lock taken waits for it and then uses the other replica's download.
+
+Every failed refresh is recorded and not retried for ``RETRY_AFTER_SECONDS``.
+
+The service root is ``BOM_ARCGIS_URL``; point it at ``arcgis_stub.py`` to test
+without the BoM service.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from disk_cache import CacheEntry, DiskCache
+
+BOM_ARCGIS_URL = os.environ.get(
+    "BOM_ARCGIS_URL",
+    "https://hosting-stg.wsapi-stg.cloud.bom.gov.au/arcgis/rest/services/"
+    "flood/National_Flood_Gauge_Network/MapServer",
+)
+CACHE_DIR = Path(".cache") / "gauges"
+CACHE_MAX_BYTES = int(float(os.environ.get("GAUGE_CACHE_MB", "256")) * 2**20)
+DEFAULT_TTL_HOURS = 24
+# Features per request; at or below the service's maxRecordCount
+PAGE_SIZE = 1000
+FETCH_WORKERS = 4
+# (connect, read) timeouts in seconds; only background threads wait on them
+REQUEST_TIMEOUT = (5, 60)
+# After a failed download, wait this long before trying again
+RETRY_AFTER_SECONDS = 60
+
+Bbox = Optional[Tuple[float, float, float, float]]
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gauge-refresh")
+_refreshing: Dict[str, Future] = {}
+_failures: Dict[str, Tuple[float, str]] = {}
+_state_lock = threading.Lock()
+cache = DiskCache(CACHE_DIR, CACHE_MAX_BYTES)
+
+
+def http_session() -> requests.Session:
+    """The shared, connection-pooled session used for all BoM requests."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=2,
+                pool_maxsize=FETCH_WORKERS,
+                max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504)),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def layer_query_params(bbox: Bbox = None) -> Dict[str, Any]:
+    params = {"where": "1=1", "outFields": "*", "outSR": 4326, "f": "geojson"}
+    if bbox:
+        xmin, ymin, xmax, ymax = bbox
+        params.update({
+            "geometry": f"{xmin},{ymin},{xmax},{ymax}",
+            "geometryType": "esriGeometryEnvelope",
+            "inSR": 4326,
+            "spatialRel": "esriSpatialRelIntersects",
+        })
+    return params
+
+
+def fetch_layer(layer: int, bbox: Bbox = None, validators: Optional[Dict[str, str]] = None
+                ) -> Tuple[Optional[Dict[str, Any]], Dict[str, str]]:
+    """Download a gauge layer as GeoJSON.
+
+    Returns ``(None, validators)`` when the server answers 304 Not Modified
+    to the conditional request, otherwise ``(geojson, new validators)``.
+    The validators only describe the first page, so the request is made
+    conditional only if the previous download fitted in one page.
+    """
+    session = http_session()
+    url = f"{BOM_ARCGIS_URL}/{layer}/query"
+    params = layer_query_params(bbox)
+    headers = {}
+    if validators and validators.get("pages") == 1:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    resp = session.get(url, params={**params, "resultOffset": 0, "resultRecordCount": PAGE_SIZE},
+                       headers=headers, timeout=REQUEST_TIMEOUT)
+    if resp.status_code == 304:
+        return None, validators or {}
+    resp.raise_for_status()
+    data = resp.json()
+    new_validators = {k: v for k, v in (("etag", resp.headers.get("ETag")),
+                                        ("last_modified", resp.headers.get("Last-Modified"))) if v}
+
+    features = data.setdefault("features", [])
+    truncated = data.pop("exceededTransferLimit", False) or data.get("properties", {}).pop("exceededTransferLimit", False)
+    if truncated or len(features) >= PAGE_SIZE:
+        count = session.get(url, params={**params, "f": "json", "returnCountOnly": "true"},
+                            timeout=REQUEST_TIMEOUT).json()["count"]
+
+        def page(offset: int):
+            r = session.get(url, params={**params, "resultOffset": offset, "resultRecordCount": PAGE_SIZE},
+                            timeout=REQUEST_TIMEOUT)
+            r.raise_for_status()
+            return r.json().get("features", [])
+
+        offsets = range(len(features), count, PAGE_SIZE)
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            for page_features in pool.map(page, offsets):
+                features.extend(page_features)
+        new_validators["pages"] = 1 + len(offsets)
+    else:
+        new_validators["pages"] = 1
+    return data, new_validators
+
+
+# --- Disk cache ---------------------------------------------------------------
+def cache_key(layer: int, bbox: Bbox = None) -> str:
+    # repr() round-trips floats exactly, so distinct boxes never share a key
+    return f"gauge_layer_{layer}_" + ("global" if bbox is None else "_".join(repr(float(v)) for v in bbox))
+
+
+def _key_bbox(key: str) -> Bbox:
+    values = key.rsplit("_", 4)[1:]
+    return None if key.endswith("_global") else tuple(float(v) for v in values)
+
+
+def _contains(outer: Bbox, inner: Bbox) -> bool:
+    if outer is None:
+        return True
+    if inner is None:
+        return False
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def clip_to_bbox(data: Dict[str, Any], bbox: Bbox) -> Dict[str, Any]:
+    """The point features of *data* that fall inside *bbox*."""
+    if bbox is None:
+        return data
+    xmin, ymin, xmax, ymax = bbox
+    features = [
+        feat for feat in data.get("features", [])
+        if xmin <= feat["geometry"]["coordinates"][0] <= xmax and ymin <= feat["geometry"]["coordinates"][1] <= ymax
+    ]
+    return {**data, "features": features}
+
+
+def find_cached_layer(layer: int, bbox: Bbox, ttl_hours: float) -> Optional[CacheEntry]:
+    """The entry for *bbox*, or failing that a fresh entry covering it (clipped)."""
+    # Candidates are inspected without marking them as used; only the entry
+    # returned is, so lookups do not disturb the LRU order
+    key = cache_key(layer, bbox)
+    entry = cache.get(key, ttl_hours, count=False, touch=False)
+    if entry is not None and entry.age_hours < ttl_hours:
+        cache.touch(key)
+        return entry
+    prefix = f"gauge_layer_{layer}_"
+    for other in cache.keys():
+        if other == key or not other.startswith(prefix) or not _contains(_key_bbox(other), bbox):
+            continue
+        covering = cache.get(other, ttl_hours, count=False, touch=False)
+        if covering is not None and covering.age_hours < ttl_hours:
+            cache.touch(other)
+            return covering._replace(value=clip_to_bbox(covering.value, bbox))
+    if entry is not None:
+        cache.touch(key)
+    return entry
+
+
+def _refresh(layer: int, bbox: Bbox, key: str, ttl_hours: float) -> None:
+    try:
+        # Waits while another process downloads this layer, then normally
+        # finds its fresh copy below
+        with cache.lock(key):
+            entry = cache.get(key, count=False)
+            if entry is not None and entry.age_hours < ttl_hours:
+                return  # Refreshed by another process meanwhile
+            data, validators = fetch_layer(layer, bbox, entry.meta if entry else None)
+            if data is None:
+                cache.revalidated(key)
+            else:
+                cache.put(key, data, validators)
+    except Exception as e:
+        with _state_lock:
+            _failures[key] = (time.time(), str(e))
+        raise
+    with _state_lock:
+        _failures.pop(key, None)
+
+
+def refresh_in_background(layer: int, bbox: Bbox = None, ttl_hours: float = DEFAULT_TTL_HOURS) -> Optional[Future]:
+    """Start refreshing a layer unless a refresh is running or recently failed."""
+    key = cache_key(layer, bbox)
+    with _state_lock:
+        running = _refreshing.get(key)
+        if running is not None and not running.done():
+            return running
+        failed = _failures.get(key)
+        if failed and time.time() - failed[0] < RETRY_AFTER_SECONDS:
+            return None
+        future = _refresh_pool.submit(_refresh, layer, bbox, key, ttl_hours)
+        _refreshing[key] = future
+        return future
+
+
+def is_refreshing(layer: int, bbox: Bbox = None) -> bool:
+    future = _refreshing.get(cache_key(layer, bbox))
+    return future is not None and not future.done()
+
+
+def layer_settled(layer: int, bbox: Bbox = None, ttl_hours: float = DEFAULT_TTL_HOURS) -> bool:
+    """True once a copy of the layer is cached or its last refresh failed.
+
+    A page showing a ``'pending'`` layer waits for this before rerunning.
+    """
+    if find_cached_layer(layer, bbox, ttl_hours) is not None:
+        return True
+    return cache_key(layer, bbox) in _failures and not is_refreshing(layer, bbox)
+
+
+def get_gauge_layer(layer: int, bbox: Bbox = None, ttl_hours: float = DEFAULT_TTL_HOURS
+                    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Return ``(geojson, info)`` immediately.
+
+    ``info['state']`` is ``'fresh'``, ``'stale'`` (older than *ttl_hours*;
+    being refreshed), ``'pending'`` (no copy yet; being downloaded) or
+    ``'error'`` (no copy and the last download failed, see ``info['error']``).
+    ``info['age_hours']`` and ``info['stored']`` give the age and download
+    time of the returned copy.
+    """
+    key = cache_key(layer, bbox)
+    entry = find_cached_layer(layer, bbox, ttl_hours)
+    if entry is not None and entry.age_hours < ttl_hours:
+        cache.record("hits")
+        return entry.value, {"state": "fresh", "age_hours": entry.age_hours, "stored": entry.stored}
+
+    refresh_in_background(layer, bbox, ttl_hours)
+    if entry is not None:
+        cache.record("stale")
+        return entry.value, {"state": "stale", "age_hours": entry.age_hours, "stored": entry.stored}
+    cache.record("misses")
+    failed = _failures.get(key)
+    if failed and not is_refreshing(layer, bbox):
+        return {}, {"state": "error", "error": failed[1]}
+    return {}, {"state": "pending"}
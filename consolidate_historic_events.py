@@ -0,0 +1,166 @@
+"""Consolidate the per-event historic parquet files into a single store.
+
+``data_parquet/`` holds two small files per historic event and dam scenario
+(``historic_with_dams_<event>_params.parquet`` /
+``historic_with_dams_<event>_timeseries.parquet`` ...). This script rewrites
+them as two files:
+
+* ``historic_timeseries.parquet`` – long format with ``event_id``,
+  ``scenario``, ``column`` (the original wide column name), ``location``,
+  ``series`` (``C`` modelled / ``R`` recorded), ``time_hours`` and ``value``.
+* ``historic_params.parquet`` – the parameter tables with ``event_id`` and
+  ``scenario`` columns added.
+
+Each (event, scenario) pair is written as its own row group, and the row group
+order is stored in the schema metadata under ``urbs_row_groups`` so the app
+can read a single event with one ``read_row_group`` call. The peak summary
+``historic_peaks.parquet`` (``historic_peaks.py``) is rewritten as well.
+
+Usage::
+
+    python consolidate_historic_events.py [--src data_parquet] [--dest data_parquet]
+"""
+import argparse
+import json
+import re
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_DIR = Path("data_parquet")
+EVENTS_FILE = "HISTORICAL_packaged_data_historic_events.parquet"
+TIMESERIES_FILE = "historic_timeseries.parquet"
+PARAMS_FILE = "historic_params.parquet"
+ROW_GROUPS_KEY = b"urbs_row_groups"
+SCENARIOS = ("with_dams", "no_dams")
+
+_SERIES_RE = re.compile(r"\((\w)\)\s*$")
+
+
+def melt_timeseries(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert a wide ``time_hours`` + ``<LOCATION> (C|R)`` table to long format.
+
+    Rows are written column by column so the wide layout can be rebuilt with a
+    single reshape.
+    """
+    cols = [c for c in df.columns if c != "time_hours"]
+    n_steps = len(df)
+    column = np.repeat(np.asarray(cols, dtype=object), n_steps)
+    location = [str(c).split(" (")[0].strip() for c in cols]
+    series = [m.group(1) if (m := _SERIES_RE.search(str(c))) else "" for c in cols]
+    return pd.DataFrame({
+        "column": pd.Categorical(column),
+        "location": pd.Categorical(np.repeat(np.asarray(location, dtype=object), n_steps)),
+        "series": pd.Categorical(np.repeat(np.asarray(series, dtype=object), n_steps)),
+        "time_hours": np.tile(df["time_hours"].to_numpy(dtype="float32"), len(cols)),
+        "value": df[cols].to_numpy(dtype="float32").T.ravel(),
+    })
+
+
+def _event_table(evt: str, scenario: str, frame: pd.DataFrame) -> pa.Table:
+    frame = frame.copy()
+    frame.insert(0, "scenario", scenario)
+    frame.insert(0, "event_id", evt)
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def _write_row_groups(path: Path, parts: List[Tuple[str, str, pa.Table]]) -> None:
+    """Write one row group per ``(event, scenario, table)`` part."""
+    tables = [table for _, _, table in parts]
+    # permissive: categoricals may come with different index widths
+    schema = pa.unify_schemas([t.schema for t in tables], promote_options="permissive").remove_metadata()
+    row_groups = json.dumps([[evt, scenario] for evt, scenario, _ in parts])
+    schema = schema.with_metadata({ROW_GROUPS_KEY: row_groups.encode()})
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for table in tables:
+            writer.write_table(table.cast(schema), row_group_size=max(table.num_rows, 1))
+    tmp_path.replace(path)
+
+
+def _read_event(src: Path, evt: str, scenario: str, kind: str) -> Optional[pa.Table]:
+    """The per-event *kind* file of (*evt*, *scenario*) as a store table, or None."""
+    path = src / f"historic_{scenario}_{evt}_{kind}.parquet"
+    if not path.exists():
+        return None
+    df = pd.read_parquet(path)
+    frame = melt_timeseries(df) if kind == "timeseries" else df.reset_index()
+    return _event_table(evt, scenario, frame)
+
+
+def consolidate_historic_events(src: Path = DEFAULT_DIR, dest: Optional[Path] = None) -> Tuple[Path, Path]:
+    """Build the consolidated timeseries and params files from *src*."""
+    dest = dest or src
+    events = pd.read_parquet(src / EVENTS_FILE).iloc[:, 0].astype(str).str.strip().tolist()
+
+    dest.mkdir(parents=True, exist_ok=True)
+    outputs = []
+    for kind, name in (("timeseries", TIMESERIES_FILE), ("params", PARAMS_FILE)):
+        parts = [
+            (evt, scenario, table)
+            for evt in events
+            for scenario in SCENARIOS
+            if (table := _read_event(src, evt, scenario, kind)) is not None
+        ]
+        _write_row_groups(dest / name, parts)
+        outputs.append(dest / name)
+    return outputs[0], outputs[1]
+
+
+def update_historic_events(store: Path, events: Sequence[str]) -> Tuple[Path, Path]:
+    """Replace (or append) the row groups of *events* in the consolidated store.
+
+    Only the given events are read from their per-event files and converted;
+    the row groups of every other event are carried over from the store as
+    they are, without going back to the per-event files. Parquet files cannot
+    be edited in place, so each store file is still written anew.
+    """
+    touched = set(events)
+    outputs = []
+    for kind, name in (("timeseries", TIMESERIES_FILE), ("params", PARAMS_FILE)):
+        path = store / name
+        parquet = pq.ParquetFile(path)
+        existing = [tuple(key) for key in json.loads(parquet.schema_arrow.metadata[ROW_GROUPS_KEY])]
+        parts = [
+            (evt, scenario, parquet.read_row_group(i))
+            for i, (evt, scenario) in enumerate(existing)
+            if evt not in touched
+        ]
+        for evt in events:
+            for scenario in SCENARIOS:
+                table = _read_event(store, evt, scenario, kind)
+                if table is not None:
+                    parts.append((evt, scenario, table))
+        # Events keep their place; new ones go at the end
+        order: dict = {}
+        for evt in [evt for evt, _ in existing] + list(events):
+            order.setdefault(evt, len(order))
+        parts.sort(key=lambda part: (order[part[0]], SCENARIOS.index(part[1])))
+        parquet.close()
+        _write_row_groups(path, parts)
+        outputs.append(path)
+    return outputs[0], outputs[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--src", type=Path, default=DEFAULT_DIR, help="directory with the per-event parquet files")
+    parser.add_argument("--dest", type=Path, default=None, help="output directory (defaults to --src)")
+    args = parser.parse_args(argv)
+
+    for path in consolidate_historic_events(args.src, args.dest):
+        meta = pq.ParquetFile(path).metadata
+        print(f"Wrote {path} ({meta.num_rows} rows, {meta.num_row_groups} row groups)")
+    # The peak summary is read from the new store now, so refresh it with it
+    # (imported here: historic_peaks imports this module)
+    from historic_peaks import write_historic_peaks
+    print(f"Wrote {write_historic_peaks(args.dest or args.src)}")
+
+
+if __name__ == "__main__":
+    main()
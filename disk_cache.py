@@ -0,0 +1,183 @@
+"""Crash-safe, compressed, size-bounded JSON cache for processes sharing a volume.
+
+Each entry is one gzip-compressed file ``<root>/<key>.json.gz`` holding the
+cached value, the time it was stored and optional metadata (e.g. HTTP
+validators):
+
+* entries are written to a temporary file and renamed over the old one, so a
+  reader never sees a partial file and a crash never leaves a corrupt entry;
+* ``lock(key)`` takes an OS file lock on ``<key>.lock``, so writers of one key
+  in different processes (app replicas) take turns, and a process can skip
+  work another one is already doing (``blocking=False``);
+* a read marks the entry as used (mtime), unless it only inspects the entry
+  (``touch=False``); when the cache grows beyond
+  ``max_bytes`` the least recently used entries are deleted;
+* ``stats()`` reports hits, misses, stale reads, writes, revalidations,
+  evictions and unreadable entries of this process.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SUFFIX = ".json.gz"
+COMPRESS_LEVEL = 6
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    stored: float
+    meta: Dict[str, Any]
+
+    @property
+    def age_hours(self) -> float:
+        return (time.time() - self.stored) / 3600
+
+
+@contextmanager
+def file_lock(path: Path, blocking: bool = True) -> Iterator[bool]:
+    """Hold an exclusive lock on *path*; yields False if *blocking* is off and it is taken."""
+    f = open(path, "a+b")
+    try:
+        try:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+class DiskCache:
+    """See the module docstring."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._counts = dict.fromkeys(("hits", "misses", "stale", "writes", "revalidated", "evictions", "errors"), 0)
+        self._lock = threading.Lock()
+        # Decoded entries, valid while the file's (inode, size) is unchanged
+        self._memory: Dict[str, Tuple[Tuple[int, int], CacheEntry]] = {}
+
+    def path(self, key: str) -> Path:
+        return self.root / f"{key}{SUFFIX}"
+
+    def keys(self) -> List[str]:
+        return [p.name[:-len(SUFFIX)] for p in self.root.glob(f"*{SUFFIX}")]
+
+    def record(self, name: str) -> None:
+        """Increment the *name* counter of ``stats()``."""
+        with self._lock:
+            self._counts[name] += 1
+
+    def get(self, key: str, max_age_hours: Optional[float] = None, count: bool = True,
+            touch: bool = True) -> Optional[CacheEntry]:
+        """The entry for *key* or None. Reads are counted as hits, or as stale
+        if the entry is older than *max_age_hours*, and mark the entry as used
+        unless *touch* is off (see ``touch``)."""
+        path = self.path(key)
+        try:
+            stat = path.stat()
+            version = (stat.st_ino, stat.st_size)
+            cached = self._memory.get(key)
+            if cached and cached[0] == version:
+                entry = cached[1]
+            else:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    raw = json.load(f)
+                entry = CacheEntry(raw["value"], raw["stored"], raw.get("meta", {}))
+                self._memory[key] = (version, entry)
+            if touch:
+                os.utime(path)
+        except FileNotFoundError:
+            entry = None
+        except (OSError, ValueError, KeyError, EOFError):
+            self.record("errors")
+            entry = None
+        if count:
+            if entry is None:
+                self.record("misses")
+            elif max_age_hours is not None and entry.age_hours >= max_age_hours:
+                self.record("stale")
+            else:
+                self.record("hits")
+        return entry
+
+    def touch(self, key: str) -> None:
+        """Mark *key* as just used, for entries read with ``touch=False``."""
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def put(self, key: str, value: Any, meta: Optional[Dict[str, Any]] = None, stored: Optional[float] = None) -> None:
+        """Store *value* atomically and evict old entries if over budget."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        payload = {"stored": stored or time.time(), "meta": meta or {}, "value": value}
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL) as f:
+            json.dump(payload, f, separators=(",", ":"))
+        tmp_path.replace(path)
+        self.record("writes")
+        self.evict(keep=key)
+
+    def revalidated(self, key: str) -> None:
+        """Mark *key* as fresh again (e.g. after an HTTP 304) without changing its value."""
+        entry = self.get(key, count=False)
+        if entry is not None:
+            self.put(key, entry.value, entry.meta)
+            self.record("revalidated")
+
+    @contextmanager
+    def lock(self, key: str, blocking: bool = True) -> Iterator[bool]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.root / f"{key}.lock", blocking) as acquired:
+            yield acquired
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        entries = []
+        for path in self.root.glob(f"*{SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            if keep and path == self.path(keep):
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            self.record("evictions")
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = [p.stat().st_size for p in self.root.glob(f"*{SUFFIX}")] if self.root.exists() else []
+        with self._lock:
+            counts = dict(self._counts)
+        return {**counts, "entries": len(sizes), "bytes": sum(sizes)}
@@ -0,0 +1,209 @@
+"""Precompute the peak-flow summary of every historic event.
+
+Writes ``historic_peaks.parquet`` to the store: one row per event, location
+and series (``Recorded``, ``Modelled (With Dams)``, ``Modelled (No Dams)``)
+with the peak flow, time of peak and volume. Event timeseries are read one at
+a time straight from parquet (the consolidated store written by
+``consolidate_historic_events.py`` if present, otherwise the per-event files;
+only the ``column``/``time_hours``/``value`` columns of the store) and
+released again, so the summary never holds more than one event in memory.
+
+``ingest_urbs_runs.py`` and ``consolidate_historic_events.py`` rewrite the
+file whenever they change the historic data, and the app reads it instead of
+scanning every event. If it is missing or older than the historic files the
+app builds the same table with ``build_stored_peak_summary``.
+
+Usage::
+
+    python historic_peaks.py [--store data_parquet]
+"""
+import argparse
+import json
+import re
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from consolidate_historic_events import (
+    DEFAULT_DIR, EVENTS_FILE, PARAMS_FILE, ROW_GROUPS_KEY, SCENARIOS, TIMESERIES_FILE,
+)
+
+PEAKS_FILE = "historic_peaks.parquet"
+PEAK_COLUMNS = ("peak_flow", "peak_time_hours", "volume_ml")
+# Historic timeseries columns, e.g. 'WOODFORD         (C)' (C modelled / R recorded)
+HISTORIC_COLUMN_PATTERN = re.compile(r"^(?P<location>.*?)\s*\((?P<series>[A-Z])\)\s*$")
+# (dam scenario, series) -> label in the peak-flow summary; the recorded
+# series is identical in both scenarios, so it is only taken once
+HISTORIC_SERIES_LABELS = {
+    ('with_dams', 'R'): 'Recorded',
+    ('with_dams', 'C'): 'Modelled (With Dams)',
+    ('no_dams', 'C'): 'Modelled (No Dams)',
+}
+
+
+def widen_historic_timeseries(long_df: pd.DataFrame) -> pd.DataFrame:
+    """Rebuild the wide ``time_hours`` + ``<LOCATION> (C|R)`` table from the
+    long format of the consolidated store (rows stored column by column)."""
+    columns = list(pd.unique(long_df['column'].astype(object)))
+    n_steps = len(long_df) // max(len(columns), 1)
+    values = long_df['value'].to_numpy().reshape(len(columns), n_steps).T
+    wide = pd.DataFrame(values, columns=columns)
+    wide.insert(0, 'time_hours', long_df['time_hours'].to_numpy()[:n_steps])
+    return wide
+
+
+def index_historic_timeseries(ts: pd.DataFrame) -> pd.DataFrame:
+    """Re-key a wide historic timeseries by ``time_hours`` with parsed
+    ``(location, series)`` columns, e.g. ``('WOODFORD', 'R')``.
+
+    Column names are parsed once here, so the UI selects a location or series
+    with a MultiIndex lookup instead of string matching on every rerun.
+    Columns without a ``(C)``/``(R)`` suffix and rows without a time (some
+    exports end with a blank row) are dropped.
+    """
+    if isinstance(ts.columns, pd.MultiIndex):
+        return ts
+    keys, cols = [], []
+    for c in ts.columns:
+        match = HISTORIC_COLUMN_PATTERN.match(c) if isinstance(c, str) else None
+        if match:
+            keys.append((match['location'].strip(), match['series']))
+            cols.append(c)
+    out = ts[cols].set_axis(pd.MultiIndex.from_tuples(keys, names=['location', 'series']), axis=1)
+    if 'time_hours' in ts.columns:
+        out.index = pd.Index(ts['time_hours'], name='time_hours')
+        out = out[out.index.notna()]
+    return out
+
+
+def summarise_timeseries_peaks(ts: pd.DataFrame) -> pd.DataFrame:
+    """Peak flow, time of peak and volume of every ``(location, series)``
+    column of a historic timeseries, computed on the whole array at once.
+
+    Volumes are in ML (m³/s integrated over ``time_hours`` × 3.6); all-NaN
+    columns give NaN throughout.
+    """
+    ts = index_historic_timeseries(ts)
+    if ts.empty:
+        return pd.DataFrame(columns=['location', 'series', *PEAK_COLUMNS])
+
+    t = ts.index.to_numpy(dtype='float64')
+    q = ts.to_numpy(dtype='float64')
+    valid = ~np.isnan(q)
+    has_data = valid.any(axis=0)
+    i_peak = np.where(valid, q, -np.inf).argmax(axis=0)
+    q0 = np.where(valid, q, 0.0)
+    volume = ((q0[1:] + q0[:-1]) * np.diff(t)[:, None]).sum(axis=0) / 2 * 3.6
+    return pd.DataFrame({
+        'location': ts.columns.get_level_values('location'),
+        'series': ts.columns.get_level_values('series'),
+        'peak_flow': np.where(has_data, q[i_peak, np.arange(q.shape[1])], np.nan),
+        'peak_time_hours': np.where(has_data, t[i_peak], np.nan),
+        'volume_ml': np.where(has_data, volume, np.nan),
+    })
+
+
+def _summary_table(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    if not parts:
+        return pd.DataFrame(columns=['event_id', 'location', 'series', *PEAK_COLUMNS])
+    df = pd.concat(parts, ignore_index=True)
+    return df.astype({'event_id': 'category', 'location': 'category', 'series': 'category',
+                      **{c: 'float32' for c in PEAK_COLUMNS}})
+
+
+def _event_peaks(evt: str, scenario: str, ts: pd.DataFrame) -> pd.DataFrame:
+    peaks = summarise_timeseries_peaks(ts)
+    peaks['series'] = [HISTORIC_SERIES_LABELS.get((scenario, s)) for s in peaks['series']]
+    peaks.insert(0, 'event_id', str(evt))
+    return peaks.dropna(subset=['series'])
+
+
+def build_historic_peak_summary(historical: Mapping) -> pd.DataFrame:
+    """Long table of peak statistics for every event of an in-memory
+    ``{'with_dams': {event: {'timeseries': ...}}, 'no_dams': ...}`` mapping
+    (e.g. the legacy pickles)."""
+    parts = []
+    for scenario in SCENARIOS:
+        for evt, evt_data in (historical.get(scenario) or {}).items():
+            ts = evt_data.get('timeseries')
+            if ts is not None and not ts.empty:
+                parts.append(_event_peaks(evt, scenario, ts))
+    return _summary_table(parts)
+
+
+def has_consolidated_store(store: Path) -> bool:
+    return (store / TIMESERIES_FILE).exists() and (store / PARAMS_FILE).exists()
+
+
+def iter_stored_timeseries(store: Path) -> Iterator[Tuple[str, str, pd.DataFrame]]:
+    """``(event, scenario, wide timeseries)`` for every historic event in *store*, read one at a time."""
+    if has_consolidated_store(store):
+        parquet = pq.ParquetFile(store / TIMESERIES_FILE)
+        row_groups = json.loads(parquet.schema_arrow.metadata[ROW_GROUPS_KEY])
+        for i, (evt, scenario) in enumerate(row_groups):
+            long_df = parquet.read_row_group(i, columns=['column', 'time_hours', 'value']).to_pandas()
+            yield evt, scenario, widen_historic_timeseries(long_df)
+        return
+    if not (store / EVENTS_FILE).exists():
+        return
+    events = pd.read_parquet(store / EVENTS_FILE).iloc[:, 0].astype(str).str.strip()
+    for evt in events:
+        for scenario in SCENARIOS:
+            path = store / f"historic_{scenario}_{evt}_timeseries.parquet"
+            if path.exists():
+                yield evt, scenario, pd.read_parquet(path)
+
+
+def build_stored_peak_summary(store: Path = DEFAULT_DIR) -> pd.DataFrame:
+    """Peak statistics of every historic event in *store*, reading one event at a time."""
+    return _summary_table([
+        _event_peaks(evt, scenario, ts)
+        for evt, scenario, ts in iter_stored_timeseries(store)
+        if not ts.empty
+    ])
+
+
+def peak_sources(store: Path) -> List[Path]:
+    """The historic files in *store* the summary is computed from."""
+    if has_consolidated_store(store):
+        return [store / TIMESERIES_FILE]
+    sources = sorted(store.glob("historic_*_timeseries.parquet"))
+    if (store / EVENTS_FILE).exists():
+        sources.append(store / EVENTS_FILE)
+    return sources
+
+
+def peaks_up_to_date(store: Path) -> bool:
+    """True if ``historic_peaks.parquet`` exists and is newer than every source file."""
+    path = store / PEAKS_FILE
+    if not path.exists():
+        return False
+    written = path.stat().st_mtime_ns
+    return all(src.stat().st_mtime_ns <= written for src in peak_sources(store))
+
+
+def write_historic_peaks(store: Path = DEFAULT_DIR) -> Path:
+    """Build the summary of *store* and write it (atomically) as ``historic_peaks.parquet``."""
+    path = store / PEAKS_FILE
+    tmp_path = path.with_name(path.name + ".tmp")
+    build_stored_peak_summary(store).to_parquet(tmp_path, index=False)
+    tmp_path.replace(path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", type=Path, default=DEFAULT_DIR, help="parquet store with the historic events")
+    args = parser.parse_args(argv)
+
+    path = write_historic_peaks(args.store)
+    peaks = pd.read_parquet(path, columns=['event_id'])
+    print(f"Wrote {path} ({len(peaks)} rows, {peaks['event_id'].nunique()} events)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Ingest new or changed URBS run outputs from a drop folder into the parquet store.
+
+Files placed in the drop folder (``incoming/`` by default) are converted into
+the layout the app reads from ``data_parquet/``:
+
+* ``historic_<with_dams|no_dams>_<event>_<timeseries|params>.(csv|parquet)`` –
+  written as the per-event parquet files, and the event is added to
+  ``HISTORICAL_packaged_data_historic_events.parquet``. If the consolidated
+  historic store (``consolidate_historic_events.py``) exists, the row groups
+  of the ingested events are replaced or appended (the others are carried
+  over), and the peak summary ``historic_peaks.parquet`` is rewritten.
+  Timeseries CSVs may be URBS result files (time in the first column).
+* ``historic_<with_dams|no_dams>_<event>.log`` – an URBS console log; the
+  parameters of its last run become the event's params file.
+* ``design_mc*.(csv|parquet)`` – Monte-Carlo rows in the ``design_mc`` schema,
+  merged into the partitioned ``design_mc/`` dataset (rewriting only the AEP
+  partitions they touch) or into ``design_mc.parquet``. Hydrographs with the
+  same AEP, location, duration, ensemble and climate scenario are replaced.
+
+``ingest_manifest.json`` in the store records the content hash and outputs of
+every ingested file, so a scan only converts new or changed files, and a
+changed file replaces the outputs of its previous version. The app picks the
+changes up on its next rerun. Its caches are keyed per table on the versions
+of that table's files (``design_mc``, ``design_b15`` or the ``historic_*``
+files), so an ingest only reloads the tables it wrote.
+
+Usage::
+
+    python ingest_urbs_runs.py [--drop incoming] [--store data_parquet] [--watch 60]
+"""
+import argparse
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from consolidate_historic_events import EVENTS_FILE, PARAMS_FILE, TIMESERIES_FILE, update_historic_events
+from historic_peaks import write_historic_peaks
+from partition_design_mc import DEFAULT_ROW_GROUP_SIZE, PARTITION_COLS, SORT_COLS
+from urbs_log_parser import parse_urbs_log, read_urbs_hydrographs, runs_to_params
+
+DEFAULT_DROP = Path("incoming")
+DEFAULT_STORE = Path("data_parquet")
+MANIFEST_FILE = "ingest_manifest.json"
+DESIGN_MC_FILE = "design_mc.parquet"
+DESIGN_MC_DATASET = "design_mc"
+MC_KEY_COLS = ["aep", "location", "duration", "ensemble", "climate_scenario_code"]
+# Labels that look numeric in CSV but must keep their text (e.g. ensemble '054')
+MC_TEXT_COLS = ["location", "duration", "ensemble", "climate_scenario_code", "event_id"]
+
+HISTORIC_RE = re.compile(r"^historic_(with_dams|no_dams)_(.+)_(params|timeseries)\.(csv|parquet)$")
+HISTORIC_LOG_RE = re.compile(r"^historic_(with_dams|no_dams)_(.+)\.log$")
+DESIGN_MC_RE = re.compile(r"^design_mc.*\.(csv|parquet)$")
+
+
+def file_sha1(path: Path) -> str:
+    """Return the SHA-1 of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(store: Path) -> Dict[str, Dict]:
+    path = store / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_manifest(store: Path, manifest: Dict[str, Dict]) -> None:
+    path = store / MANIFEST_FILE
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    tmp_path.replace(path)
+
+
+def write_parquet(df: pd.DataFrame, path: Path, index: Optional[bool] = None) -> None:
+    """Write *df* to *path* via a temporary file, so readers never see a partial file."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    df.to_parquet(tmp_path, index=index)
+    tmp_path.replace(path)
+
+
+def read_source(path: Path, index_col: Optional[str] = None, text_cols: Sequence[str] = ()) -> pd.DataFrame:
+    """Read a CSV or parquet drop file; *text_cols* are read from CSV as strings."""
+    if path.suffix == ".csv":
+        df = pd.read_csv(path, dtype={c: str for c in text_cols})
+        if index_col and index_col in df.columns:
+            df = df.set_index(index_col)
+        return df
+    return pd.read_parquet(path)
+
+
+def ingest_historic_file(path: Path, store: Path, scenario: str, evt: str, kind: str) -> List[str]:
+    """Write one historic params/timeseries table (or URBS log) as its per-event parquet file."""
+    if path.suffix == ".log":
+        runs, _ = parse_urbs_log(path)
+        df = runs_to_params(runs.tail(1))
+    elif kind == "timeseries" and path.suffix == ".csv":
+        df = read_urbs_hydrographs(path)
+    else:
+        df = read_source(path, index_col="Model" if kind == "params" else None)
+    out = store / f"historic_{scenario}_{evt}_{kind}.parquet"
+    write_parquet(df, out, index=kind == "params")
+    return [out.name]
+
+
+def update_event_index(store: Path, new_events: List[str]) -> bool:
+    """Append *new_events* to the historic events list; return True if it changed."""
+    path = store / EVENTS_FILE
+    events = pd.read_parquet(path) if path.exists() else pd.DataFrame({"event_id": pd.Series(dtype=str)})
+    column = events.columns[0]
+    known = set(events[column].astype(str).str.strip())
+    added = sorted(set(new_events) - known)
+    if not added:
+        return False
+    events = pd.concat([events, pd.DataFrame({column: added})], ignore_index=True)
+    write_parquet(events, path, index=False)
+    return True
+
+
+def prepare_design_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Give MC rows the dtypes and order used by ``partition_design_mc.py``."""
+    if "datetime" in df.columns:
+        df["datetime"] = pd.to_datetime(df["datetime"])
+    for c in df.select_dtypes(include=["object", "string"]).columns:
+        df[c] = df[c].astype(str).astype("category")
+    sort_cols = [c for c in (*PARTITION_COLS, *SORT_COLS) if c in df.columns]
+    for c in sort_cols:
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].cat.reorder_categories(sorted(df[c].cat.categories))
+    return df.sort_values(sort_cols, kind="stable", ignore_index=True)
+
+
+def merge_design_rows(existing: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Replace the hydrographs of *existing* that *new* provides again and add the rest."""
+    # CSV drops come back as float64/int64; keep the store's compact dtypes
+    new = new.astype({
+        c: existing[c].dtype for c in new.columns
+        if c in existing.columns and not isinstance(existing[c].dtype, pd.CategoricalDtype)
+    })
+    keys = [c for c in MC_KEY_COLS if c in new.columns and c in existing.columns]
+    replaced = pd.MultiIndex.from_frame(existing[keys].astype(str)).isin(
+        pd.MultiIndex.from_frame(new[keys].astype(str).drop_duplicates())
+    )
+    return prepare_design_rows(pd.concat([existing[~replaced], new], ignore_index=True))
+
+
+def ingest_design_mc_file(path: Path, store: Path, tag: str) -> List[str]:
+    """Merge the MC rows in *path* into the design store.
+
+    With the partitioned ``design_mc/`` dataset only the partitions (AEPs)
+    present in *path* are rewritten; otherwise ``design_mc.parquet`` is.
+    Returns no outputs: the rows become part of the shared store.
+    """
+    df = prepare_design_rows(read_source(path, text_cols=MC_TEXT_COLS))
+    dataset_dir = store / DESIGN_MC_DATASET
+    if dataset_dir.is_dir():
+        for value, rows in df.groupby(list(PARTITION_COLS), sort=True):
+            part_dir = dataset_dir.joinpath(*(f"{c}={v}" for c, v in zip(PARTITION_COLS, value)))
+            old_files = sorted(part_dir.glob("*.parquet"))
+            rows = rows.drop(columns=list(PARTITION_COLS))
+            if old_files:
+                schema = pq.read_schema(old_files[0]).remove_metadata()
+                rows = merge_design_rows(pd.read_parquet(part_dir), rows)
+            else:
+                part_dir.mkdir(parents=True)
+                schema = None
+            table = pa.Table.from_pandas(rows, schema=schema, preserve_index=False)
+            # Write the new file before removing the old ones so the partition never disappears
+            out = part_dir / f"part-{tag}.parquet"
+            tmp_path = out.with_name(out.name + ".tmp")
+            pq.write_table(table, tmp_path, row_group_size=DEFAULT_ROW_GROUP_SIZE)
+            tmp_path.replace(out)
+            for old in old_files:
+                if old != out:
+                    old.unlink()
+        return []
+
+    mc_path = store / DESIGN_MC_FILE
+    if mc_path.exists():
+        df = merge_design_rows(pd.read_parquet(mc_path), df)
+    write_parquet(df, mc_path, index=False)
+    return []
+
+
+def ingest_drop_folder(drop: Path = DEFAULT_DROP, store: Path = DEFAULT_STORE
+                       ) -> Tuple[Dict[str, List[str]], Dict[str, str]]:
+    """Convert every new or changed file in *drop* into *store*.
+
+    Returns ``({drop file name: [outputs]}, {drop file name: error})`` for the
+    files that were ingested and those that failed (and are retried on the
+    next scan).
+    """
+    store.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(store)
+    ingested: Dict[str, List[str]] = {}
+    skipped: Dict[str, str] = {}
+    new_events: List[str] = []
+
+    for path in sorted(p for p in drop.glob("*") if p.is_file()):
+        historic = HISTORIC_RE.match(path.name)
+        historic_log = HISTORIC_LOG_RE.match(path.name)
+        if not historic and not historic_log and not DESIGN_MC_RE.match(path.name):
+            continue
+        sha1 = file_sha1(path)
+        previous = manifest.get(path.name, {})
+        if previous.get("sha1") == sha1:
+            continue
+
+        try:
+            if historic or historic_log:
+                scenario, evt, kind = historic.groups()[:3] if historic else (*historic_log.groups(), "params")
+                outputs = ingest_historic_file(path, store, scenario, evt.strip(), kind)
+                new_events.append(evt.strip())
+            else:
+                outputs = ingest_design_mc_file(path, store, sha1[:12])
+        except Exception as e:
+            # Leave it out of the manifest so the next scan retries it
+            skipped[path.name] = str(e)
+            continue
+
+        # A changed drop file replaces whatever its previous version produced
+        for stale in set(previous.get("outputs", [])) - set(outputs):
+            (store / stale).unlink(missing_ok=True)
+        manifest[path.name] = {"sha1": sha1, "outputs": outputs, "ingested": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        save_manifest(store, manifest)
+        ingested[path.name] = outputs
+
+    if new_events:
+        update_event_index(store, new_events)
+        if (store / TIMESERIES_FILE).exists() and (store / PARAMS_FILE).exists():
+            update_historic_events(store, list(dict.fromkeys(new_events)))
+        write_historic_peaks(store)
+    return ingested, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drop", type=Path, default=DEFAULT_DROP, help="folder scanned for new URBS outputs")
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE, help="parquet store read by the app")
+    parser.add_argument("--watch", type=float, default=0, metavar="SECONDS",
+                        help="keep scanning every SECONDS instead of exiting after one pass")
+    args = parser.parse_args(argv)
+
+    while True:
+        ingested, skipped = ingest_drop_folder(args.drop, args.store)
+        for name, outputs in ingested.items():
+            print(f"Ingested {name}" + (f" -> {', '.join(outputs)}" if outputs else ""))
+        for name, error in skipped.items():
+            print(f"Skipped {name}: {error}")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Convert ``data_parquet/design_mc.parquet`` into a partitioned dataset.
+
+The Monte-Carlo design table is rewritten as a hive-style dataset
+(``data_parquet/design_mc/aep=100/part-0.parquet`` ...) with the rows of each
+partition sorted by location, duration, ensemble, climate scenario and time,
+and written in small row groups. Parquet keeps min/max statistics per row
+group, so the app can pass ``filters=`` for a single selection and pyarrow only
+decodes the handful of row groups that hold that hydrograph.
+
+Usage::
+
+    python partition_design_mc.py
+    python partition_design_mc.py --src data_parquet/design_mc.parquet \\
+        --dest data_parquet/design_mc --row-group-size 20000
+"""
+import argparse
+import shutil
+from pathlib import Path
+from typing import Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DEFAULT_SRC = Path("data_parquet") / "design_mc.parquet"
+DEFAULT_DEST = Path("data_parquet") / "design_mc"
+PARTITION_COLS = ("aep",)
+SORT_COLS = ("location", "duration", "ensemble", "climate_scenario_code", "time_hours")
+# ~40 hydrographs per row group: small enough to prune, large enough to compress
+DEFAULT_ROW_GROUP_SIZE = 20_000
+
+
+def convert_design_mc(
+    src: Path = DEFAULT_SRC,
+    dest: Path = DEFAULT_DEST,
+    partition_cols: Sequence[str] = PARTITION_COLS,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> Path:
+    """Write *src* as a hive-partitioned, sorted dataset under *dest*.
+
+    Any existing dataset at *dest* is replaced.
+    """
+    df = pd.read_parquet(src)
+    sort_cols = [c for c in (*partition_cols, *SORT_COLS) if c in df.columns]
+    for c in sort_cols:
+        # Sort categoricals lexically so row-group min/max statistics stay tight
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].cat.reorder_categories(sorted(df[c].cat.categories))
+    df = df.sort_values(sort_cols, kind="stable", ignore_index=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    partition_schema = pa.schema([table.schema.field(c) for c in partition_cols])
+    if dest.exists():
+        shutil.rmtree(dest)
+    ds.write_dataset(
+        table,
+        dest,
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive"),
+        basename_template="part-{i}.parquet",
+        max_rows_per_group=row_group_size,
+        min_rows_per_group=row_group_size,
+    )
+    return dest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--src", type=Path, default=DEFAULT_SRC, help="source design_mc parquet file")
+    parser.add_argument("--dest", type=Path, default=DEFAULT_DEST, help="output dataset directory")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    args = parser.parse_args(argv)
+
+    dest = convert_design_mc(args.src, args.dest, row_group_size=args.row_group_size)
+    files = sorted(dest.rglob("*.parquet"))
+    row_groups = sum(pq.ParquetFile(f).metadata.num_row_groups for f in files)
+    print(f"Wrote {len(files)} files ({row_groups} row groups) to {dest}")
+
+
+if __name__ == "__main__":
+    main()
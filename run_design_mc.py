@@ -0,0 +1,257 @@
+"""Run a Monte-Carlo design matrix of URBS runs in parallel and collect the results.
+
+Every combination of the ``--aep``, ``--duration``, ``--ensemble`` and
+``--scenario`` values is one URBS run. Runs are spread over a process pool
+(one worker per core by default); each run gets its own working directory
+``<workdir>/aep<aep>_<duration>_<ensemble>_<scenario>/``, into which the model
+template (``--template``) is copied together with a ``job.json`` describing
+the run, and URBS is started there with the path of ``job.json`` as its last
+argument (``URBS_COMMAND``, or the local ``urbs_stub.py``; see
+``urbs_jobs.py``).
+
+The result CSVs a run writes (time column followed by ``<LOCATION> (C)``
+columns, one file per sub-model) are converted in the worker into rows of the
+``design_mc`` schema and saved as ``result.parquet`` in the run's directory,
+with the run's timing and exit status in ``run.json``. A run whose directory
+already holds both files is skipped, so an interrupted batch resumes where it
+stopped (``--force`` reruns everything). Per-run timings are written to
+``<workdir>/runs.csv``.
+
+Finally all results are combined into ``<out>/design_mc_<name>.parquet``. The
+default ``--out`` is the ``incoming/`` drop folder, so ``ingest_urbs_runs.py``
+merges the batch into the store.
+
+Usage::
+
+    python run_design_mc.py --aep 2 5 10 100 --duration 24h 72h \\
+        --ensemble 1-100 --scenario E CC2 CC4 --template model [--workers 32]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from ingest_urbs_runs import DEFAULT_DROP, prepare_design_rows
+from urbs_jobs import urbs_command
+from urbs_log_parser import parse_urbs_log, read_urbs_hydrographs
+
+DEFAULT_WORKDIR = Path(".cache") / "design_mc_runs"
+RESULT_FILE = "result.parquet"
+RUN_FILE = "run.json"
+CONSOLE_LOG = "urbsout.log"
+# Climate scenario code -> name used in design_mc.parquet
+CLIMATE_SCENARIOS = {'E': 'SSP2 2030', 'CC2': 'SSP3 2070', 'CC4': 'SSP5 2090'}
+# Result CSV columns holding modelled flows, e.g. 'IPSWICH (C)'
+MODELLED_SUFFIX = "(C)"
+# Column order of design_mc.parquet
+DESIGN_MC_COLUMNS = [
+    "datetime", "location", "flow_rate", "model_name", "duration", "ensemble", "aep", "climate_scenario_code",
+    "event_id", "climate_scenario", "alpha", "m", "beta", "il", "cl", "model_source", "time_hours",
+]
+START_DATETIME = "2015-04-14 19:00"
+
+
+def expand_ensembles(values: Sequence[str]) -> List[str]:
+    """Expand ``'1-100'`` style ranges into zero-padded labels ('001' ... '100')."""
+    labels: List[str] = []
+    for value in values:
+        if "-" in value:
+            first, last = value.split("-", 1)
+            labels.extend(f"{i:03d}" for i in range(int(first), int(last) + 1))
+        else:
+            labels.append(value.zfill(3) if value.isdigit() else value)
+    return labels
+
+
+def run_name(run: Dict) -> str:
+    return f"aep{run['aep']}_{run['duration']}_{run['ensemble']}_{run['climate_scenario']}"
+
+
+def collect_results(run: Dict, workdir: Path, inputs: Sequence[str] = ()) -> pd.DataFrame:
+    """Convert the result CSVs and console log of a finished run into ``design_mc`` rows.
+
+    CSV files named in *inputs* (copied from the model template) are not results.
+    """
+    params = {}
+    log = workdir / CONSOLE_LOG
+    if log.exists():
+        runs, _ = parse_urbs_log(log)
+        if not runs.empty:
+            params = runs.iloc[-1][["alpha", "m", "beta"]].to_dict()
+
+    frames = []
+    for csv in sorted(p for p in workdir.glob("*.csv") if p.name not in inputs):
+        wide = read_urbs_hydrographs(csv)
+        modelled = [c for c in wide.columns if str(c).strip().endswith(MODELLED_SUFFIX)]
+        long = wide.melt(id_vars="time_hours", value_vars=modelled, var_name="location", value_name="flow_rate")
+        long["location"] = (
+            long["location"].str.replace(MODELLED_SUFFIX, "", regex=False).str.strip().str.replace(r"\s+", "_", regex=True)
+        )
+        long["model_name"] = csv.name
+        frames.append(long.dropna(subset=["time_hours"]))
+    if not frames:
+        raise FileNotFoundError(f"no result CSV in {workdir}")
+
+    df = pd.concat(frames, ignore_index=True)
+    code = run["climate_scenario"]
+    df = df.assign(
+        datetime=pd.Timestamp(START_DATETIME) + pd.to_timedelta(df["time_hours"].astype("float64"), unit="h"),
+        duration=run["duration"],
+        ensemble=run["ensemble"],
+        aep=run["aep"],
+        climate_scenario_code=code,
+        event_id=f"{run['aep']} - {run['duration']} - {run['ensemble']}",
+        climate_scenario=CLIMATE_SCENARIOS.get(code, code),
+        alpha=params.get("alpha"),
+        m=params.get("m"),
+        beta=params.get("beta"),
+        il=float("nan"),
+        cl=float("nan"),
+        model_source="MonteCarlo",
+    )
+    return df[DESIGN_MC_COLUMNS].astype({
+        "datetime": "datetime64[ns]", "flow_rate": "float64", "aep": "int16", "alpha": "float32", "m": "float32",
+        "beta": "float32", "il": "float32", "cl": "float32", "time_hours": "float32",
+    })
+
+
+def run_one(run: Dict, workroot: str, template: Optional[str], command: List[str]) -> Dict:
+    """Run one matrix entry in its own directory; executed in a pool worker."""
+    workdir = Path(workroot) / run_name(run)
+    if workdir.exists():
+        shutil.rmtree(workdir)
+    if template:
+        shutil.copytree(template, workdir)
+    else:
+        workdir.mkdir(parents=True)
+    spec_file = workdir / "job.json"
+    spec_file.write_text(json.dumps({"kind": "design", "model": "design_MC", **run}, indent=2))
+
+    record = {**run, "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "status": "failed", "rows": 0}
+    t0 = time.perf_counter()
+    with open(workdir / CONSOLE_LOG, "w") as log:
+        proc = subprocess.run([*command, str(spec_file.resolve())], cwd=workdir,
+                              stdout=log, stderr=subprocess.STDOUT)
+    record["run_seconds"] = round(time.perf_counter() - t0, 3)
+    record["returncode"] = proc.returncode
+    if proc.returncode == 0:
+        try:
+            df = collect_results(run, workdir, os.listdir(template) if template else ())
+            df.to_parquet(workdir / RESULT_FILE, index=False)
+            record.update(status="done", rows=len(df))
+        except Exception as e:
+            record["error"] = str(e)
+    record["total_seconds"] = round(time.perf_counter() - t0, 3)
+    # run.json is written last: its presence with status 'done' marks the run complete
+    (workdir / RUN_FILE).write_text(json.dumps(record, indent=2))
+    return record
+
+
+def completed_run(workroot: Path, run: Dict) -> Optional[Dict]:
+    """The record of a previously finished run, or None if it must be (re)run."""
+    workdir = workroot / run_name(run)
+    try:
+        record = json.loads((workdir / RUN_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    if record.get("status") != "done" or not (workdir / RESULT_FILE).exists():
+        return None
+    return record
+
+
+def run_design_matrix(
+    aeps: Sequence[int],
+    durations: Sequence[str],
+    ensembles: Sequence[str],
+    scenarios: Sequence[str],
+    workroot: Path = DEFAULT_WORKDIR,
+    template: Optional[Path] = None,
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> pd.DataFrame:
+    """Run every combination not yet completed and return the per-run timing table."""
+    workroot.mkdir(parents=True, exist_ok=True)
+    matrix = [
+        {"aep": int(aep), "duration": duration, "ensemble": ensemble, "climate_scenario": scenario}
+        for aep, duration, ensemble, scenario in product(aeps, durations, ensembles, scenarios)
+    ]
+    records: List[Dict] = []
+    pending = []
+    for run in matrix:
+        previous = None if force else completed_run(workroot, run)
+        if previous:
+            records.append({**previous, "resumed": True})
+        else:
+            pending.append(run)
+    print(f"{len(matrix)} runs, {len(matrix) - len(pending)} already complete, {len(pending)} to run")
+
+    command = urbs_command()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [
+            pool.submit(run_one, run, str(workroot), str(template) if template else None, command)
+            for run in pending
+        ]
+        for i, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            records.append({**record, "resumed": False})
+            print(f"[{i}/{len(pending)}] {run_name(record)} {record['status']} in {record['total_seconds']:.1f}s")
+
+    timings = pd.DataFrame(records)
+    timings.to_csv(workroot / "runs.csv", index=False)
+    return timings
+
+
+def combine_results(workroot: Path, timings: pd.DataFrame) -> pd.DataFrame:
+    """Concatenate the results of the completed runs in *timings*."""
+    done = timings[timings["status"] == "done"]
+    frames = [pd.read_parquet(workroot / run_name(run) / RESULT_FILE) for run in done.to_dict("records")]
+    if not frames:
+        return pd.DataFrame()
+    return prepare_design_rows(pd.concat(frames, ignore_index=True))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--aep", type=int, nargs="+", required=True, help="AEPs as 1 in N years, e.g. 2 100 2000")
+    parser.add_argument("--duration", nargs="+", required=True, help="storm durations, e.g. 24h 72h")
+    parser.add_argument("--ensemble", nargs="+", required=True, help="ensemble members or ranges, e.g. 1-100 254")
+    parser.add_argument("--scenario", nargs="+", default=["E"], choices=sorted(CLIMATE_SCENARIOS),
+                        help="climate scenario codes")
+    parser.add_argument("--template", type=Path, default=None, help="model folder copied into every run directory")
+    parser.add_argument("--workdir", type=Path, default=DEFAULT_WORKDIR, help="root of the per-run directories")
+    parser.add_argument("--out", type=Path, default=DEFAULT_DROP, help="folder for the combined design_mc file")
+    parser.add_argument("--name", default=None, help="suffix of the combined file (default: timestamp)")
+    parser.add_argument("--workers", type=int, default=None, help="parallel runs (default: number of cores)")
+    parser.add_argument("--force", action="store_true", help="rerun runs that already completed")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    timings = run_design_matrix(
+        args.aep, args.duration, expand_ensembles(args.ensemble), args.scenario,
+        workroot=args.workdir, template=args.template, workers=args.workers, force=args.force,
+    )
+    failed = timings[timings["status"] != "done"]
+    results = combine_results(args.workdir, timings)
+    if not results.empty:
+        args.out.mkdir(parents=True, exist_ok=True)
+        out = args.out / f"design_mc_{args.name or time.strftime('%Y%m%d_%H%M%S')}.parquet"
+        results.to_parquet(out, index=False)
+        print(f"Wrote {len(results):,} rows from {len(timings) - len(failed)} runs to {out}")
+    print(f"Finished in {time.perf_counter() - t0:.1f}s; run timings in {args.workdir / 'runs.csv'}")
+    if not failed.empty:
+        print(f"{len(failed)} runs failed (see urbsout.log in their folders): "
+              + ", ".join(run_name(r) for r in failed.to_dict("records")))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
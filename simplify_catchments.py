@@ -0,0 +1,218 @@
+"""Simplify the catchment polygons in ``geo/`` for display on the Map page.
+
+The raw ``geo/*.geojson`` files hold ~40,000 vertices with six-decimal,
+three-dimensional coordinates. For each zoom tier in ``ZOOM_TIERS`` the
+polygons are
+
+* quantised to the tier's grid (``decimals``) and stripped of the unused Z
+  value;
+* simplified with Douglas-Peucker at the tier's tolerance, without breaking
+  the topology between catchments: every ring is cut into arcs at the
+  junctions where a shared boundary starts or ends, and each arc is
+  simplified on its own, always in the same direction. A border shared by two
+  catchments therefore simplifies identically on both sides, with no gaps or
+  slivers between them;
+* serialised as compact GeoJSON, keeping only the ``Name`` property.
+
+Results are stored in ``.cache/geo/`` keyed on the tier and the names, sizes
+and modification times of the source files, so they are rebuilt only when a
+file in ``geo/`` changes. Running this script builds every tier up front.
+
+Usage::
+
+    python simplify_catchments.py [--geo geo]
+"""
+import argparse
+import hashlib
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from disk_cache import DiskCache
+
+DEFAULT_GEO_DIR = Path("geo")
+CACHE_DIR = Path(".cache") / "geo"
+CACHE_MAX_BYTES = 64 * 2**20
+# tier -> (highest map zoom it is used for, tolerance in degrees, coordinate decimals)
+ZOOM_TIERS = {
+    "low": (8, 0.002, 3),
+    "medium": (11, 0.0004, 4),
+    "high": (99, 0.00005, 5),
+}
+KEEP_PROPERTIES = ("Name",)
+
+cache = DiskCache(CACHE_DIR, CACHE_MAX_BYTES)
+
+
+def zoom_tier(zoom: float) -> str:
+    """The coarsest tier detailed enough for map zoom level *zoom*."""
+    for tier, (max_zoom, _, _) in ZOOM_TIERS.items():
+        if zoom <= max_zoom:
+            return tier
+    return next(reversed(ZOOM_TIERS))
+
+
+def source_signature(geo_dir: Path = DEFAULT_GEO_DIR) -> str:
+    """Hash of the names, sizes and mtimes of the GeoJSON files in *geo_dir*."""
+    digest = hashlib.md5()
+    for path in sorted(Path(geo_dir).glob("*.geojson")):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Boolean mask of the *points* kept by Douglas-Peucker; the ends are always kept."""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        segment = end - start
+        inner = points[first + 1:last] - start
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+def _simplify_arc(arc: np.ndarray, tolerance: float) -> np.ndarray:
+    # Simplify in a canonical direction so both owners of a shared arc agree
+    if tuple(arc[0]) > tuple(arc[-1]):
+        return _simplify_arc(arc[::-1], tolerance)[::-1]
+    return arc[douglas_peucker(arc, tolerance)]
+
+
+def _ring_breaks(ring: np.ndarray, junctions: set) -> List[int]:
+    """Indices of the junction vertices of *ring* (its arc ends)."""
+    breaks = [i for i, p in enumerate(map(tuple, ring)) if p in junctions]
+    if len(breaks) < 2:
+        # Unshared ring: cut at its first vertex and the vertex farthest from it
+        far = int(np.argmax(np.hypot(*(ring - ring[0]).T)))
+        breaks = sorted({0, far})
+    return breaks
+
+
+def simplify_rings(rings: List[np.ndarray], tolerance: float) -> List[np.ndarray]:
+    """Topology-preserving simplification of closed rings (without the repeated end point)."""
+    # A junction is a vertex whose neighbours differ between the rings through
+    # it, i.e. where a shared boundary starts or ends
+    neighbours = defaultdict(set)
+    for ring in rings:
+        points = list(map(tuple, ring))
+        for i, p in enumerate(points):
+            neighbours[p].add(frozenset((points[i - 1], points[(i + 1) % len(points)])))
+    junctions = {p for p, pairs in neighbours.items() if len(pairs) > 1}
+
+    simplified = []
+    for ring in rings:
+        breaks = _ring_breaks(ring, junctions)
+        parts = []
+        for a, b in zip(breaks, breaks[1:] + [breaks[0] + len(ring)]):
+            arc = np.take(ring, range(a, b + 1), axis=0, mode="wrap")
+            parts.append(_simplify_arc(arc, tolerance)[:-1])
+        out = np.concatenate(parts)
+        # Never collapse a ring to a line or point
+        simplified.append(out if len(out) >= 3 else ring)
+    return simplified
+
+
+def _quantised_ring(coords: List, decimals: int) -> np.ndarray:
+    ring = np.round(np.asarray(coords, dtype=float)[:, :2], decimals)
+    # Drop consecutive duplicates created by quantisation, and the closing point
+    ring = ring[np.r_[True, np.any(np.diff(ring, axis=0) != 0, axis=1)]]
+    if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+        ring = ring[:-1]
+    return ring
+
+
+def simplify_layers(layers: Dict[str, Dict], tolerance: float, decimals: int) -> Dict[str, Dict]:
+    """Simplify every polygon of the named GeoJSON *layers* together."""
+    rings: List[np.ndarray] = []
+    # (layer, feature index, polygon index, ring index) for each entry of rings
+    slots: List[Tuple[str, int, int, int]] = []
+    for name, layer in layers.items():
+        for f, feature in enumerate(layer.get("features", [])):
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") == "Polygon":
+                polygons = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiPolygon":
+                polygons = geometry["coordinates"]
+            else:
+                continue
+            for p, polygon in enumerate(polygons):
+                for r, coords in enumerate(polygon):
+                    rings.append(_quantised_ring(coords, decimals))
+                    slots.append((name, f, p, r))
+
+    simplified = simplify_rings(rings, tolerance)
+    rebuilt: Dict[Tuple[str, int], Dict[int, Dict[int, List]]] = defaultdict(lambda: defaultdict(dict))
+    for (name, f, p, r), ring in zip(slots, simplified):
+        closed = np.vstack([ring, ring[:1]])
+        rebuilt[name, f][p][r] = np.round(closed, decimals).tolist()
+
+    result = {}
+    for name, layer in layers.items():
+        features = []
+        for f, feature in enumerate(layer.get("features", [])):
+            if (name, f) not in rebuilt:
+                continue
+            polygons = [[rings_[r] for r in sorted(rings_)] for _, rings_ in sorted(rebuilt[name, f].items())]
+            geometry = (
+                {"type": "Polygon", "coordinates": polygons[0]}
+                if feature["geometry"]["type"] == "Polygon"
+                else {"type": "MultiPolygon", "coordinates": polygons}
+            )
+            properties = {k: v for k, v in (feature.get("properties") or {}).items() if k in KEEP_PROPERTIES}
+            features.append({"type": "Feature", "properties": properties, "geometry": geometry})
+        result[name] = {"type": "FeatureCollection", "features": features}
+    return result
+
+
+def load_simplified_catchments(tier: str, geo_dir: Path = DEFAULT_GEO_DIR) -> Dict[str, Dict]:
+    """``{layer name: GeoJSON}`` of the catchments in *geo_dir* simplified for *tier*."""
+    key = f"catchments_{tier}_{source_signature(geo_dir)}"
+    entry = cache.get(key)
+    if entry is not None:
+        return entry.value
+    layers = {}
+    for path in sorted(Path(geo_dir).glob("*.geojson")):
+        with path.open("r", encoding="utf-8") as f:
+            layers[path.stem] = json.load(f)
+    _, tolerance, decimals = ZOOM_TIERS[tier]
+    result = simplify_layers(layers, tolerance, decimals)
+    cache.put(key, result)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--geo", type=Path, default=DEFAULT_GEO_DIR, help="folder of catchment .geojson files")
+    args = parser.parse_args(argv)
+
+    raw = sum(p.stat().st_size for p in args.geo.glob("*.geojson"))
+    print(f"Source: {raw / 1024:,.0f} KB")
+    for tier in ZOOM_TIERS:
+        t0 = time.perf_counter()
+        layers = load_simplified_catchments(tier, args.geo)
+        size = sum(len(json.dumps(layer, separators=(",", ":"))) for layer in layers.values())
+        print(f"{tier:>6}: {size / 1024:,.0f} KB in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
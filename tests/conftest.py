@@ -0,0 +1,7 @@
+"""The app's modules are top-level scripts; make them importable from the tests."""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
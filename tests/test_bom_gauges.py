@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from concurrent.futures import wait
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import bom_gauges
+from arcgis_stub import EXTENT, make_handler
+from disk_cache import DiskCache
+
+COUNT = 2500
+MAX_RECORDS = 1000
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("localhost", 0), make_handler(COUNT, MAX_RECORDS, delay=0))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def stub(server, monkeypatch, tmp_path):
+    monkeypatch.setattr(bom_gauges, "BOM_ARCGIS_URL", server)
+    monkeypatch.setattr(bom_gauges, "PAGE_SIZE", MAX_RECORDS)
+    monkeypatch.setattr(bom_gauges, "cache", DiskCache(tmp_path / "gauges", 10**8))
+
+
+def small_bbox():
+    xmin, ymin, _, _ = EXTENT
+    return (xmin, ymin, xmin + 2.0, ymin + 2.0)
+
+
+def test_fetch_layer_pages_through_every_feature():
+    data, validators = bom_gauges.fetch_layer(1)
+    ids = [f["properties"]["OBJECTID"] for f in data["features"]]
+    assert sorted(ids) == list(range(1, COUNT + 1))
+    assert validators["pages"] == 3
+    assert "exceededTransferLimit" not in data and "exceededTransferLimit" not in data.get("properties", {})
+
+
+def test_single_page_revalidates_with_304():
+    data, validators = bom_gauges.fetch_layer(1, small_bbox())
+    assert 0 < len(data["features"]) < MAX_RECORDS
+    assert validators["pages"] == 1 and validators["etag"]
+    again, same = bom_gauges.fetch_layer(1, small_bbox(), validators)
+    assert again is None
+    assert same == validators
+
+
+def test_multi_page_layers_are_not_conditional():
+    _, validators = bom_gauges.fetch_layer(1)
+    # The first page's ETag would match, but later pages are not covered by it
+    data, _ = bom_gauges.fetch_layer(1, None, validators)
+    assert data is not None and len(data["features"]) == COUNT
+
+
+def test_cache_key_keeps_full_precision():
+    a = bom_gauges.cache_key(1, (150.0, -28.0, 152.1234567, -26.0))
+    b = bom_gauges.cache_key(1, (150.0, -28.0, 152.1234568, -26.0))
+    assert a != b
+    assert bom_gauges._key_bbox(a) == (150.0, -28.0, 152.1234567, -26.0)
+    assert bom_gauges.cache_key(1) == "gauge_layer_1_global"
+
+
+def test_find_cached_layer_clips_covering_entry():
+    cache = bom_gauges.cache
+    data, _ = bom_gauges.fetch_layer(1)
+    cache.put(bom_gauges.cache_key(1), data)
+    other = (140.0, -20.0, 141.0, -19.0)
+    cache.put(bom_gauges.cache_key(1, other), {"features": []})
+    for key in cache.keys():
+        os.utime(cache.path(key), (100, 100))
+
+    bbox = small_bbox()
+    entry = bom_gauges.find_cached_layer(1, bbox, ttl_hours=24)
+    xmin, ymin, xmax, ymax = bbox
+    assert entry.value["features"]
+    assert all(xmin <= f["geometry"]["coordinates"][0] <= xmax and ymin <= f["geometry"]["coordinates"][1] <= ymax
+               for f in entry.value["features"])
+    # Only the entry used is marked as recently used
+    assert cache.path(bom_gauges.cache_key(1)).stat().st_mtime > 100
+    assert cache.path(bom_gauges.cache_key(1, other)).stat().st_mtime == 100
+    assert bom_gauges.find_cached_layer(2, bbox, ttl_hours=24) is None
+
+
+# --- get_gauge_layer ----------------------------------------------------------
+@pytest.fixture
+def state(monkeypatch):
+    """Fresh refresh bookkeeping for each test."""
+    monkeypatch.setattr(bom_gauges, "_refreshing", {})
+    monkeypatch.setattr(bom_gauges, "_failures", {})
+
+
+def finish_refresh(layer, bbox=None):
+    future = bom_gauges._refreshing.get(bom_gauges.cache_key(layer, bbox))
+    if future is not None:
+        wait([future], timeout=30)
+
+
+def test_missing_layer_is_pending_then_fresh(state):
+    data, info = bom_gauges.get_gauge_layer(1, small_bbox())
+    assert (data, info) == ({}, {"state": "pending"})
+    finish_refresh(1, small_bbox())
+    assert bom_gauges.layer_settled(1, small_bbox())
+    data, info = bom_gauges.get_gauge_layer(1, small_bbox())
+    assert info["state"] == "fresh" and data["features"]
+    assert info["age_hours"] < 1
+
+
+def test_stale_layer_is_revalidated_after_304(state):
+    bbox = small_bbox()
+    data, validators = bom_gauges.fetch_layer(1, bbox)
+    bom_gauges.cache.put(bom_gauges.cache_key(1, bbox), data, validators, stored=time.time() - 48 * 3600)
+
+    served, info = bom_gauges.get_gauge_layer(1, bbox, ttl_hours=24)
+    assert info["state"] == "stale" and info["age_hours"] > 24
+    assert served == data
+    finish_refresh(1, bbox)
+    assert bom_gauges.cache.stats()["revalidated"] == 1
+    assert bom_gauges.get_gauge_layer(1, bbox, ttl_hours=24)[1]["state"] == "fresh"
+
+
+def test_failed_refresh_backs_off(state, monkeypatch):
+    calls = []
+
+    def broken(layer, bbox=None, validators=None):
+        calls.append(layer)
+        raise OSError("disk full")  # not a requests error
+
+    monkeypatch.setattr(bom_gauges, "fetch_layer", broken)
+    assert bom_gauges.get_gauge_layer(1)[1]["state"] == "pending"
+    finish_refresh(1)
+    assert bom_gauges.layer_settled(1)
+    assert bom_gauges.get_gauge_layer(1)[1] == {"state": "error", "error": "disk full"}
+    assert len(calls) == 1  # within RETRY_AFTER_SECONDS nothing is retried
+
+    monkeypatch.setattr(bom_gauges, "RETRY_AFTER_SECONDS", 0)
+    assert bom_gauges.get_gauge_layer(1)[1]["state"] == "pending"
+    finish_refresh(1)
+    assert len(calls) == 2
+
+
+def test_refresh_waits_for_another_process(state, monkeypatch):
+    bbox = small_bbox()
+    key = bom_gauges.cache_key(1, bbox)
+    calls = []
+    fetch_layer = bom_gauges.fetch_layer
+    monkeypatch.setattr(bom_gauges, "fetch_layer", lambda *args: calls.append(args) or fetch_layer(*args))
+    data, validators = fetch_layer(1, bbox)
+
+    # file_lock opens its own file, so it is exclusive against the refresh thread too
+    with bom_gauges.cache.lock(key):
+        assert bom_gauges.get_gauge_layer(1, bbox)[1]["state"] == "pending"
+        time.sleep(0.2)
+        # The refresh keeps waiting; the page keeps polling rather than rerunning
+        assert bom_gauges.is_refreshing(1, bbox)
+        assert not bom_gauges.layer_settled(1, bbox)
+        assert bom_gauges.get_gauge_layer(1, bbox)[1]["state"] == "pending"
+        bom_gauges.cache.put(key, data, validators)  # the other process's download
+    finish_refresh(1, bbox)
+    assert calls == []  # its copy is used instead of downloading again
+    assert bom_gauges.get_gauge_layer(1, bbox)[1]["state"] == "fresh"
@@ -0,0 +1,83 @@
+import os
+import threading
+
+from disk_cache import DiskCache, file_lock
+
+
+def test_put_get_roundtrip(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10**6)
+    cache.put("layer", {"features": [1, 2, 3]}, meta={"etag": "abc"})
+    entry = cache.get("layer", max_age_hours=1)
+    assert entry.value == {"features": [1, 2, 3]}
+    assert entry.meta == {"etag": "abc"}
+    assert entry.age_hours < 1
+    assert cache.get("missing") is None
+    # The write goes through a temporary file that is renamed into place
+    assert [p.name for p in tmp_path.iterdir()] == ["layer.json.gz"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["writes"], stats["entries"]) == (1, 1, 1, 1)
+
+
+def test_stale_entries_are_counted(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10**6)
+    cache.put("old", [1], stored=1)
+    assert cache.get("old", max_age_hours=24).value == [1]
+    assert cache.stats()["stale"] == 1
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10**6)
+    cache.path("broken").write_bytes(b"not gzip")
+    assert cache.get("broken") is None
+    assert cache.stats()["errors"] == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10**6)
+    value = list(range(200))
+    for i, key in enumerate(["a", "b"]):
+        cache.put(key, value)
+        os.utime(cache.path(key), (i, i))
+    cache.max_bytes = cache.stats()["bytes"] + 10
+    cache.get("a")  # Reading marks 'a' as used, so 'b' is now the oldest
+    cache.put("c", value)
+    assert sorted(cache.keys()) == ["a", "c"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_get_without_touch_keeps_lru_order(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10**6)
+    cache.put("a", [1])
+    os.utime(cache.path("a"), (100, 100))
+    cache.get("a", count=False, touch=False)
+    assert cache.path("a").stat().st_mtime == 100
+    assert cache.stats()["hits"] == 0
+    cache.touch("a")
+    assert cache.path("a").stat().st_mtime > 100
+    cache.touch("missing")
+
+
+def test_revalidated_refreshes_stored_time(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10**6)
+    cache.put("a", [1], meta={"etag": "x"}, stored=1)
+    cache.revalidated("a")
+    entry = cache.get("a")
+    assert entry.age_hours < 1 and entry.meta == {"etag": "x"}
+    assert cache.stats()["revalidated"] == 1
+
+
+def test_lock_is_exclusive(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10**6)
+    results = []
+    with cache.lock("a") as acquired:
+        assert acquired
+        thread = threading.Thread(target=lambda: results.append(_try_lock(tmp_path / "a.lock")))
+        thread.start()
+        thread.join()
+    assert results == [False]
+    assert _try_lock(tmp_path / "a.lock")
+
+
+def _try_lock(path):
+    with file_lock(path, blocking=False) as acquired:
+        return acquired
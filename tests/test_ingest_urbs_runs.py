@@ -0,0 +1,128 @@
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from consolidate_historic_events import EVENTS_FILE, PARAMS_FILE, TIMESERIES_FILE, consolidate_historic_events
+from historic_peaks import PEAKS_FILE, peaks_up_to_date
+from ingest_urbs_runs import (
+    DESIGN_MC_DATASET, MANIFEST_FILE, ingest_drop_folder, load_manifest, merge_design_rows, prepare_design_rows,
+)
+from partition_design_mc import convert_design_mc
+
+
+def mc_rows(aep, ensemble, flow, location="IPSWICH", duration="24h", steps=3):
+    return pd.DataFrame({
+        "aep": aep,
+        "location": location,
+        "duration": duration,
+        "ensemble": ensemble,
+        "climate_scenario_code": "E",
+        "time_hours": [float(t) for t in range(steps)],
+        "flow_rate": [flow * (t + 1) for t in range(steps)],
+    })
+
+
+@pytest.fixture
+def mc_store(tmp_path):
+    store, drop = tmp_path / "store", tmp_path / "incoming"
+    store.mkdir()
+    drop.mkdir()
+    base = prepare_design_rows(pd.concat([mc_rows(10, "001", 1.0), mc_rows(100, "001", 10.0),
+                                          mc_rows(100, "002", 20.0)], ignore_index=True))
+    base.to_parquet(store / "design_mc.parquet", index=False)
+    convert_design_mc(store / "design_mc.parquet", store / DESIGN_MC_DATASET)
+    (store / "design_mc.parquet").unlink()
+    return store, drop
+
+
+def test_merge_design_rows_replaces_matching_hydrographs():
+    existing = prepare_design_rows(pd.concat([mc_rows(100, "001", 10.0), mc_rows(100, "002", 20.0)]))
+    new = mc_rows(100, "002", 99.0, steps=2)
+    merged = merge_design_rows(existing, new)
+    assert len(merged) == 3 + 2
+    replaced = merged[merged["ensemble"] == "002"]
+    assert replaced["flow_rate"].tolist() == [99.0, 198.0]
+    assert merged[merged["ensemble"] == "001"]["flow_rate"].tolist() == [10.0, 20.0, 30.0]
+
+
+def test_design_drop_rewrites_only_touched_partition(mc_store):
+    store, drop = mc_store
+    dataset = store / DESIGN_MC_DATASET
+    untouched = {p: p.stat().st_mtime_ns for p in (dataset / "aep=10").glob("*.parquet")}
+
+    pd.concat([mc_rows(100, "002", 5.0), mc_rows(100, "003", 7.0)]).to_csv(drop / "design_mc_new.csv", index=False)
+    ingested, skipped = ingest_drop_folder(drop, store)
+
+    assert list(ingested) == ["design_mc_new.csv"] and not skipped
+    assert {p: p.stat().st_mtime_ns for p in (dataset / "aep=10").glob("*.parquet")} == untouched
+    files = list((dataset / "aep=100").glob("*.parquet"))
+    assert len(files) == 1 and not list(dataset.rglob("*.tmp"))
+    part = pd.read_parquet(files[0])
+    flows = part.groupby(part["ensemble"].astype(str))["flow_rate"].max().to_dict()
+    assert flows == {"001": 30.0, "002": 15.0, "003": 21.0}
+    # Ensemble labels stay text ('002', not 2) and the rows stay sorted
+    assert part["ensemble"].astype(str).tolist() == sorted(part["ensemble"].astype(str))
+    assert pq.read_schema(files[0]).field("flow_rate").type == pq.read_schema(next(iter(untouched))).field("flow_rate").type
+
+    # An unchanged drop file is not ingested again
+    assert ingest_drop_folder(drop, store) == ({}, {})
+    assert "design_mc_new.csv" in load_manifest(store)
+
+
+def test_failed_file_is_reported_and_retried(mc_store):
+    store, drop = mc_store
+    (drop / "design_mc_bad.csv").write_text("not,a\nmc,table\n")
+    ingested, skipped = ingest_drop_folder(drop, store)
+    assert not ingested and list(skipped) == ["design_mc_bad.csv"]
+    assert "design_mc_bad.csv" not in load_manifest(store)
+    assert list(ingest_drop_folder(drop, store)[1]) == ["design_mc_bad.csv"]
+
+
+def historic_frames(scale):
+    ts = pd.DataFrame({
+        "time_hours": [0.0, 1.0, 2.0],
+        "IPSWICH (C)": [1.0 * scale, 3.0 * scale, 2.0 * scale],
+        "IPSWICH (R)": [1.0, 2.5, 2.0],
+    })
+    params = pd.DataFrame({"alpha": [0.3 * scale], "beta": [4.0]}, index=pd.Index(["lower17"], name="Model"))
+    return ts, params
+
+
+@pytest.fixture
+def historic_store(tmp_path):
+    store, drop = tmp_path / "store", tmp_path / "incoming"
+    store.mkdir()
+    drop.mkdir()
+    for i, evt in enumerate(["20110110", "20130127"]):
+        for scenario in ("with_dams", "no_dams"):
+            ts, params = historic_frames(i + 1)
+            ts.to_parquet(store / f"historic_{scenario}_{evt}_timeseries.parquet", index=False)
+            params.to_parquet(store / f"historic_{scenario}_{evt}_params.parquet")
+    pd.DataFrame({"event_id": ["20110110", "20130127"]}).to_parquet(store / EVENTS_FILE, index=False)
+    consolidate_historic_events(store)
+    return store, drop
+
+
+def test_historic_drop_updates_store_like_a_full_rebuild(historic_store, tmp_path):
+    store, drop = historic_store
+    ts, params = historic_frames(10)
+    ts.to_csv(drop / "historic_with_dams_20110110_timeseries.csv", index=False)
+    ts.to_csv(drop / "historic_with_dams_20220225_timeseries.csv", index=False)
+    params.to_csv(drop / "historic_with_dams_20220225_params.csv")
+
+    ingested, skipped = ingest_drop_folder(drop, store)
+    assert len(ingested) == 3 and not skipped
+
+    rebuilt = tmp_path / "rebuilt"
+    consolidate_historic_events(store, rebuilt)
+    for name in (TIMESERIES_FILE, PARAMS_FILE):
+        updated, full = pq.ParquetFile(store / name), pq.ParquetFile(rebuilt / name)
+        assert updated.schema_arrow.metadata == full.schema_arrow.metadata
+        pd.testing.assert_frame_equal(updated.read().to_pandas().astype(str), full.read().to_pandas().astype(str))
+
+    assert peaks_up_to_date(store)
+    peaks = pd.read_parquet(store / PEAKS_FILE)
+    peak = peaks[(peaks["event_id"] == "20110110") & (peaks["series"] == "Modelled (With Dams)")]["peak_flow"]
+    assert peak.tolist() == [30.0]
+    assert "20220225" in set(peaks["event_id"])
+    assert (store / MANIFEST_FILE).exists()
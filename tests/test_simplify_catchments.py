@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+import pytest
+
+import simplify_catchments
+from disk_cache import DiskCache
+from simplify_catchments import douglas_peucker, simplify_layers, zoom_tier
+
+
+def wiggly_edge(n=50, amplitude=0.01):
+    """Vertices of a noisy boundary from (1, 0) up to (1, 1)."""
+    y = np.linspace(0, 1, n)
+    x = 1 + amplitude * np.sin(y * 40)
+    return [[float(a), float(b), 0.0] for a, b in zip(x, y)]
+
+
+def square_layers():
+    edge = wiggly_edge()
+    west = [[0.0, 0.0, 0.0], *edge, [0.0, 1.0, 0.0], [0.0, 0.0, 0.0]]
+    east = [*edge[::-1], [2.0, 1.0, 0.0], [2.0, 0.0, 0.0], edge[-1]]
+    polygon = lambda ring, name: {
+        "type": "Feature",
+        "properties": {"Name": name, "AREA": 1.0},
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+    }
+    return {
+        "west": {"type": "FeatureCollection", "features": [polygon(west, "West")]},
+        "east": {"type": "FeatureCollection", "features": [polygon(east, "East")]},
+    }
+
+
+def shared_vertices(ring):
+    return {tuple(p) for p in ring if 0.5 < p[0] < 1.5}
+
+
+def test_shared_edge_simplifies_identically():
+    result = simplify_layers(square_layers(), tolerance=0.005, decimals=4)
+    west = result["west"]["features"][0]["geometry"]["coordinates"][0]
+    east = result["east"]["features"][0]["geometry"]["coordinates"][0]
+    edge = shared_vertices(west)
+    assert 3 <= len(edge) < 50  # simplified, but the wiggle is not flattened
+    assert edge == shared_vertices(east)
+    # Rings stay closed, 2-D and keep only the whitelisted properties
+    assert west[0] == west[-1] and len(west[0]) == 2
+    assert result["west"]["features"][0]["properties"] == {"Name": "West"}
+
+
+def test_douglas_peucker_keeps_ends():
+    points = np.array([[0, 0], [1, 0.001], [2, -0.001], [3, 0], [4, 5]], dtype=float)
+    keep = douglas_peucker(points, tolerance=0.01)
+    assert keep[0] and keep[-1]
+    assert keep.tolist() == [True, False, False, True, True]
+    assert douglas_peucker(points, tolerance=0).all()
+
+
+@pytest.mark.parametrize("zoom, tier", [(0, "low"), (8, "low"), (9, "medium"), (11, "medium"),
+                                        (12, "high"), (200, "high")])
+def test_zoom_tier(zoom, tier):
+    assert zoom_tier(zoom) == tier
+
+
+def test_load_simplified_catchments_is_cached(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path / "cache", 10**7)
+    monkeypatch.setattr(simplify_catchments, "cache", cache)
+    geo = tmp_path / "geo"
+    geo.mkdir()
+    for name, layer in square_layers().items():
+        (geo / f"{name}.geojson").write_text(json.dumps(layer))
+
+    first = simplify_catchments.load_simplified_catchments("low", geo)
+    assert set(first) == {"east", "west"}
+    assert simplify_catchments.load_simplified_catchments("low", geo) == first
+    assert (cache.stats()["misses"], cache.stats()["hits"]) == (1, 1)
+
+    # Changing a source file changes the key, so the tier is rebuilt
+    (geo / "west.geojson").write_text(json.dumps(square_layers()["west"]) + "\n")
+    simplify_catchments.load_simplified_catchments("low", geo)
+    assert cache.stats()["misses"] == 2
@@ -0,0 +1,100 @@
+import os
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+
+from urbs_jobs import FINAL_STATUSES, JobQueue, ResultCache
+
+
+def wait_for(queue, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in FINAL_STATUSES:
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setenv("URBS_STUB_DELAY", "0")
+    monkeypatch.setattr("urbs_jobs.MODEL_DIR", tmp_path / "model")
+    q = JobQueue(tmp_path / "jobs.sqlite", tmp_path / "jobs", workers=2,
+                 cache=ResultCache(tmp_path / "results", 10**9)).start()
+    yield q
+    q.stop()
+
+
+def test_result_cache_moves_and_evicts(tmp_path):
+    cache = ResultCache(tmp_path / "results", max_bytes=150)
+    for i in range(3):
+        workdir = tmp_path / f"job{i}"
+        workdir.mkdir()
+        (workdir / "out.csv").write_bytes(b"x" * 100)
+        path = cache.put(f"key{i}", workdir)
+        assert not workdir.exists() and (path / "out.csv").exists()
+        os.utime(path, (i, i))
+    # Over budget: only the most recently used result is kept
+    assert [cache.get(f"key{i}") is not None for i in range(3)] == [False, False, True]
+
+
+def test_job_runs_and_is_moved_into_result_cache(queue, tmp_path):
+    job_id = queue.submit("historic", {"event": "20110110"})
+    job = wait_for(queue, job_id)
+    assert job["status"] == "done" and job["progress"] == 1.0
+    assert job["message"].startswith("Finished")
+    workdir = Path(job["workdir"])
+    assert workdir.parent == tmp_path / "results"
+    assert (workdir / "urbsout.log").exists()
+    # Nothing is left behind in the jobs folder
+    assert not any((tmp_path / "jobs").iterdir())
+
+
+def test_identical_runs_join_or_reuse(queue):
+    first = queue.submit("design", {"aep": 100})
+    assert queue.submit("design", {"aep": 100}) == first
+    done = wait_for(queue, first)
+    again = queue.submit("design", {"aep": 100})
+    assert again != first
+    reused = queue.get(again)
+    assert reused["status"] == "done" and reused["workdir"] == done["workdir"]
+
+
+def test_failed_run(tmp_path, monkeypatch):
+    monkeypatch.setenv("URBS_STUB_DELAY", "0")
+    monkeypatch.setattr("urbs_jobs.MODEL_DIR", tmp_path / "model")
+    from urbs_jobs import STUB_COMMAND
+    q = JobQueue(tmp_path / "jobs.sqlite", tmp_path / "jobs", workers=1, command=[*STUB_COMMAND, "--fail"],
+                 cache=ResultCache(tmp_path / "results", 10**9)).start()
+    try:
+        job = wait_for(q, q.submit("historic", {"event": "x"}))
+    finally:
+        q.stop()
+    assert job["status"] == "failed" and job["returncode"] == 1
+    assert (tmp_path / "jobs" / job["id"] / "urbsout.log").exists()
+    assert not (tmp_path / "results").exists() or not any((tmp_path / "results").iterdir())
+
+
+def test_result_larger_than_cache_is_kept(tmp_path):
+    cache = ResultCache(tmp_path / "results", max_bytes=10)
+    workdir = tmp_path / "job"
+    workdir.mkdir()
+    (workdir / "out.csv").write_bytes(b"x" * 100)
+    path = cache.put("big", workdir)
+    assert (path / "out.csv").exists()
+    assert cache.get("big") == path
+
+
+def test_evicted_result_is_run_again(queue):
+    job_id = queue.submit("design", {"aep": 50})
+    workdir = Path(wait_for(queue, job_id)["workdir"])
+    shutil.rmtree(workdir)  # evicted by later results
+
+    job = queue.get(job_id)
+    assert job["status"] in ("queued", "running") and job["workdir"] is None
+    job = wait_for(queue, job_id)
+    assert job["status"] == "done" and Path(job["workdir"]) == workdir
+    assert (workdir / "urbsout.log").exists()
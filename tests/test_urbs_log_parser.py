@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from urbs_log_parser import iter_urbs_runs, parse_urbs_log, read_urbs_hydrographs, runs_to_params
+
+LOG = Path(__file__).resolve().parent.parent / "data" / "urbsout.log"
+
+
+def test_parse_bundled_log():
+    runs, files = parse_urbs_log(LOG)
+    assert len(runs) == 4
+    assert runs["run"].tolist() == [1, 2, 3, 4]
+    first = runs.iloc[0]
+    assert first["ini_file"] == "lower17.ini"
+    assert first["model"] == "SPLIT"
+    assert (first["alpha"], first["m"], first["beta"], first["n"]) == (0.3, 0.8, 4.0, 1.0)
+    assert first["area"] == pytest.approx(13508.1)
+    assert first["pluviographs"] == 104
+    assert runs["finished"].notna().all()
+    # Every run accesses files in both sections; rainfall files follow the rainfall header
+    assert set(files["section"]) == {"catchment", "rainfall"}
+    assert set(files["run"]) == {1, 2, 3, 4}
+    assert files.iloc[0]["path"] == "lower17.dat"
+
+
+def test_run_blocks_split_on_banner():
+    lines = [
+        "Reading initialisation file a.ini",
+        "Parameters: alpha =0.5000, m =  0.70, beta =  3.00, n =  1.00",
+        "Use by   only: URBS Run dated Mon Jan 01 10:00:00",
+        "Reading initialisation file b.ini",
+        "Reading Rainfall File rain.rdf ...",
+        "Accessing file gauge.txt",
+    ]
+    runs = list(iter_urbs_runs(lines))
+    assert [r["ini_file"] for r in runs] == ["a.ini", "b.ini"]
+    assert runs[0]["run_dated"] is None and runs[1]["run_dated"] == "Mon Jan 01 10:00:00"
+    assert runs[0]["alpha"] == 0.5
+    assert runs[1]["finished"] is None
+    assert runs[1]["files"] == [("rainfall", "gauge.txt")]
+
+
+def test_runs_to_params_layout():
+    runs, _ = parse_urbs_log(LOG)
+    params = runs_to_params(runs.tail(1))
+    assert params.index.name == "Model"
+    assert params.index.tolist() == ["lower17"]
+    assert params["alpha"].iloc[0] == 0.3
+    assert params["Initial Loss (mm)"].isna().all()
+
+
+def test_read_urbs_hydrographs(tmp_path):
+    csv = tmp_path / "lower17.csv"
+    csv.write_text("Time, IPSWICH (C), MOGGILL (C)\n0.0, 1.5, 2\n1.0, 3.0, x\n")
+    df = read_urbs_hydrographs(csv, chunksize=1)
+    assert df.columns.tolist() == ["time_hours", "IPSWICH (C)", "MOGGILL (C)"]
+    assert df["time_hours"].tolist() == [0.0, 1.0]
+    assert (df.dtypes == "float32").all()
+    assert pd.isna(df.loc[1, "MOGGILL (C)"])
@@ -1,185 +1,846 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import time
 import gzip
 import pickle
 import re
 import datetime
 import base64
 import os
-import requests
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import feather
 from pathlib import Path
 import hashlib
 import folium
 import altair as alt
+from folium.plugins import FastMarkerCluster
 from streamlit_folium import st_folium
-from typing import Dict, Any, Optional, List, Tuple
+from collections import deque
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Callable, Dict, Any, Iterable, Optional, List, Tuple
+from urbs_log_parser import parse_urbs_log
+from historic_peaks import (
+    HISTORIC_SERIES_LABELS, PEAKS_FILE, build_historic_peak_summary, build_stored_peak_summary,
+    index_historic_timeseries, peaks_up_to_date, widen_historic_timeseries,
+)
+from urbs_jobs import FINAL_STATUSES, JobQueue
+from bom_gauges import cache as gauge_cache, get_gauge_layer, layer_settled
+from simplify_catchments import load_simplified_catchments, source_signature, zoom_tier
 
 # --- Configuration ---
 # Directory containing legacy pickled "packaged_data" files (kept for backwards-compatibility)
 PACKAGED_DATA_DIR = Path("packaged_data")
 # Directory containing modern parquet versions of the same datasets
 PARQUET_DATA_DIR = Path("data_parquet")
+# Per-event historic files, e.g. historic_with_dams_18870119_timeseries.parquet
+HISTORIC_FILE_PATTERN = re.compile(r"^historic_(with_dams|no_dams)_(.+)_(params|timeseries)\.parquet$")
+# Consolidated historic store written by consolidate_historic_events.py
+HISTORIC_STORE_FILES = {
+    'timeseries': PARQUET_DATA_DIR / "historic_timeseries.parquet",
+    'params': PARQUET_DATA_DIR / "historic_params.parquet",
+}
+# Hive-partitioned version of design_mc.parquet written by partition_design_mc.py
+DESIGN_MC_DATASET_DIR = PARQUET_DATA_DIR / "design_mc"
+# Files (globs under PARQUET_DATA_DIR) behind each table of the packaged data;
+# each table is cached under the version of its own files only
+DATA_TABLE_FILES = {
+    'design_MC': ("design_mc.parquet", "design_mc/**/*.parquet"),
+    'design_B15': ("design_b15.parquet",),
+    'historical': ("HISTORICAL_packaged_data_historic_events.parquet", "historic_*.parquet"),
+}
+# Optional memory-mapped Arrow IPC (Feather v2) cache of the tables served
+# through st.cache_resource (design_MC), enabled with URBS_ARROW_CACHE=1 so
+# app replicas on one host share pages
+USE_ARROW_CACHE = os.environ.get("URBS_ARROW_CACHE", "").lower() in ("1", "true", "yes")
+ARROW_CACHE_DIR = Path(".cache") / "arrow"
+# Bump when the layout of the cached tables changes so old entries are ignored
+ARROW_CACHE_FORMAT = 2
+# Target dtypes applied to every loaded table by compact_frame. Integer columns
+# that hold text labels (e.g. MC durations '120h', ensembles '054') become
+# categoricals, whose codes are already small integers.
+COMPACT_SCHEMA = {
+    'float32': ('flow_rate', 'qts', 'hts', 'time_hours', 'value', 'aep_years', 'alpha', 'm', 'beta', 'il', 'cl'),
+    'integer': ('duration', 'Duration', 'ensemble', 'Ensemble_ID', 'Storm_ID', 'aep', 'AEP_Years'),
+    'category': ('location', 'climate_scenario_code', 'climate_scenario', 'model_name', 'model_source',
+                 'event_id', 'scenario', 'column', 'series'),
+}
+# Selector order of the Monte-Carlo design page, outermost first
+MC_INDEX_COLUMNS = ('aep_years', 'location', 'duration', 'ensemble', 'climate_scenario_code')
+# Rows sent to the browser per line chart; roughly the plot width in pixels,
+# above which hydrographs are downsampled (see minmax_downsample)
+CHART_MAX_POINTS = 1000
+# Lines of the raw URBS log shown on the Model Performance page
+LOG_TAIL_LINES = 200
+# Display name -> column of the historic peak-flow summary
+PEAK_METRICS = {
+    'Peak flow (m³/s)': 'peak_flow',
+    'Time of peak (h)': 'peak_time_hours',
+    'Volume (ML)': 'volume_ml',
+}
+# Gauge layers of the BoM flood gauge network: (layer id, label, marker colour)
+GAUGE_LAYERS = ((5, "River gauges", "blue"), (4, "Rain gauges", "green"))
+# Map extents selectable on the Map page (lon/lat bbox)
+MAP_EXTENTS = {
+    "SE Queensland": (151.5, -28.5, 153.4, -26.2),  # SE QLD bbox including Toowoomba
+    "Queensland": (137.9, -29.2, 153.6, -9.0),
+}
+# From this zoom level on, gauges are drawn individually instead of clustered
+GAUGE_CLUSTER_MAX_ZOOM = 12
+# URBS switches selectable on the Settings page; part of every run's inputs
+URBS_SWITCHES = ["URBS TFLW", "URBS ATKN", "URBS MATCH", "URBS BASEFLOW"]
+# Seconds between job status refreshes while an URBS run is queued or running
+JOB_POLL_SECONDS = 1.0
 
 # --- Data Loading ---
-@st.cache_data(show_spinner="Loading packaged data (parquet/pickle)...")
-def load_packaged_data() -> Dict[str, Any]:
-    """Load model datasets from either **data_parquet** (preferred) or legacy
-    **packaged_data** pickles so that the rest of the interface continues to
-    work unchanged.
+def get_data_version(table: str, parquet_dir: Path = PARQUET_DATA_DIR) -> str:
+    """Return a fingerprint of the files behind *table* (see
+    ``DATA_TABLE_FILES``) built from their names, sizes and modification times.
+
+    It is passed into the cached loaders so that replacing or adding a parquet
+    file invalidates the shared cache of that table automatically, without
+    having to clear it on every rerun; writing one table leaves the caches of
+    the others in place.
+    """
+    if not parquet_dir.exists():
+        return ""
+    digest = hashlib.md5()
+    paths = {p for pattern in DATA_TABLE_FILES[table] for p in parquet_dir.glob(pattern)}
+    for path in sorted(p for p in paths if p.is_file()):
+        stat = path.stat()
+        digest.update(f"{path.relative_to(parquet_dir)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
 
-    The function builds a nested dict with the expected keys/structure:
-        data = {
-            'historical': {
-                'historic_events': List[str],
-                'with_dams': {event_id: {'params': DataFrame, 'timeseries': DataFrame}},
-                'no_dams' :  { ... same structure ... }
-            },
-            'design_MC':  {'design_events': DataFrame},
-            'design_B15': {'design_events': DataFrame}
-        }
-    Only the pieces that can be found are populated; missing parts are kept as
-    ``None`` so that calling code can degrade gracefully.
+
+def get_data_versions(parquet_dir: Path = PARQUET_DATA_DIR) -> Dict[str, str]:
+    """``get_data_version`` of every table of the packaged data."""
+    return {table: get_data_version(table, parquet_dir) for table in DATA_TABLE_FILES}
+
+
+@st.cache_resource
+def get_memory_report() -> Dict[str, Dict[str, Any]]:
+    """Process-wide record of the memory saved by ``compact_frame`` per table."""
+    return {}
+
+
+def compact_frame(df: pd.DataFrame, table: str, default_float32: bool = False) -> pd.DataFrame:
+    """Downcast *df* according to ``COMPACT_SCHEMA`` and record the saving.
+
+    With *default_float32* every remaining float64 column (e.g. the wide
+    historic flow/level columns) is also stored as float32.
     """
-    data: Dict[str, Any] = {
-        'historical': None,
-        'design_MC': None,
-        'design_B15': None,
+    before = df.memory_usage(deep=True).sum()
+    for col in df.columns:
+        series = df[col]
+        if col in COMPACT_SCHEMA['float32'] or (default_float32 and series.dtype == 'float64'):
+            if pd.api.types.is_float_dtype(series) or pd.api.types.is_integer_dtype(series):
+                df[col] = series.astype('float32')
+        elif col in COMPACT_SCHEMA['integer']:
+            if pd.api.types.is_integer_dtype(series):
+                df[col] = pd.to_numeric(series, downcast='integer')
+            elif not pd.api.types.is_numeric_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.astype('category')
+        elif col in COMPACT_SCHEMA['category'] and not isinstance(series.dtype, pd.CategoricalDtype):
+            if not pd.api.types.is_numeric_dtype(series):
+                df[col] = series.astype('category')
+    after = df.memory_usage(deep=True).sum()
+    get_memory_report()[table] = {
+        'Table': table,
+        'Rows': len(df),
+        'Before (MB)': round(before / 1e6, 2),
+        'After (MB)': round(after / 1e6, 2),
+        'Saved (MB)': round((before - after) / 1e6, 2),
     }
+    return df
+
+
+def file_digest(path: Path) -> str:
+    """Return the SHA-1 of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_with_arrow_cache(name: str, sources: List[Path], build: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """Return ``build()`` via an uncompressed Feather v2 file under ``.cache/arrow``.
+
+    The cache file is keyed on the content hashes of *sources*, so it is rebuilt
+    automatically when the source parquet changes. It is opened memory-mapped,
+    letting worker processes on the same host share the page cache instead of
+    each decoding the Snappy parquet. Without ``URBS_ARROW_CACHE`` this simply
+    calls *build*.
+    """
+    if not USE_ARROW_CACHE:
+        return build()
+
+    digest = hashlib.sha1(f"v{ARROW_CACHE_FORMAT}".encode())
+    for src in sources:
+        digest.update(file_digest(src).encode())
+    cache_file = ARROW_CACHE_DIR / f"{name}-{digest.hexdigest()[:16]}.arrow"
+
+    if not cache_file.exists():
+        ARROW_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(build(), preserve_index=None)
+        # Write-then-rename so other workers never map a half-written file
+        tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        feather.write_feather(table, tmp_file, compression="uncompressed")
+        os.replace(tmp_file, cache_file)
+        for stale in ARROW_CACHE_DIR.glob(f"{name}-*.arrow"):
+            if stale != cache_file:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass  # still mapped by another process (Windows)
+
+    table = feather.read_table(cache_file, memory_map=True)
+    # split_blocks keeps numeric columns as zero-copy views of the mapping
+    return table.to_pandas(split_blocks=True)
+
+
+@st.cache_data(show_spinner=False)
+def read_historic_parquet(path: str, mtime_ns: int = 0) -> pd.DataFrame:
+    """Read a single per-event historic parquet file (cached across sessions).
+
+    *mtime_ns* is only part of the cache key, so a rewritten file is re-read.
+    Not memory-mapped via ``read_with_arrow_cache``: ``st.cache_data`` hands
+    out copies, so mapped pages would not be shared anyway.
+    """
+    name = Path(path).stem
+    return compact_frame(pd.read_parquet(path), name, default_float32=name.endswith('_timeseries'))
+
+
+@st.cache_data(show_spinner=False)
+def read_historic_row_group(path: str, row_group: int, kind: str, mtime_ns: int = 0) -> pd.DataFrame:
+    """Read one event's table from the consolidated historic store.
+
+    Each (event, scenario) is its own row group, so this decodes only that
+    event. *mtime_ns* is only part of the cache key.
+    """
+    table = pq.ParquetFile(path).read_row_group(row_group)
+    df = table.drop(['event_id', 'scenario']).to_pandas()
+    if kind == 'timeseries':
+        name = f"{Path(path).stem}[{row_group}]"
+        return compact_frame(widen_historic_timeseries(df), name, default_float32=True)
+    return df.set_index('Model') if 'Model' in df.columns else df
+
+
+def read_historic_source(source: Tuple) -> pd.DataFrame:
+    """Read a table described by an index entry: ``('file', path, mtime_ns)``
+    or ``('row_group', path, row_group, kind, mtime_ns)``."""
+    if source[0] == 'row_group':
+        return read_historic_row_group(*source[1:])
+    return read_historic_parquet(*source[1:])
+
+
+class HistoricEventData(Mapping):
+    """Lazy ``{'params': DataFrame, 'timeseries': DataFrame}`` for one event.
+
+    Each table is read from parquet the first time its key is accessed and then
+    kept on the instance, so only the events a user actually opens are loaded.
+    Timeseries are returned with ``(location, series)`` columns (see
+    ``index_historic_timeseries``).
+    """
+
+    def __init__(self, sources: Dict[str, Tuple]):
+        self._sources = dict(sources)
+        self._frames: Dict[str, pd.DataFrame] = {}
+
+    def __getitem__(self, key: str) -> pd.DataFrame:
+        if key not in self._frames:
+            self._frames[key] = self.read(key)
+        return self._frames[key]
+
+    def __iter__(self):
+        return iter(self._sources)
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(self._frames)
+
+    @property
+    def sources(self) -> Dict[str, Tuple]:
+        return dict(self._sources)
+
+    def read(self, key: str) -> pd.DataFrame:
+        """Return *key* without keeping it on the instance (for bulk scans)."""
+        if key in self._frames:
+            return self._frames[key]
+        frame = read_historic_source(self._sources[key])
+        return index_historic_timeseries(frame) if key == 'timeseries' else frame
+
+
+class HistoricEventStore(Mapping):
+    """Index of per-event historic parquet files for one dam scenario.
+
+    Behaves like the ``{event_id: {'params': ..., 'timeseries': ...}}`` dict the
+    UI expects, but only records file paths up front.
+    """
+
+    def __init__(self, events: Dict[str, Dict[str, Tuple]]):
+        self._events = {evt: HistoricEventData(paths) for evt, paths in events.items()}
+
+    def __getitem__(self, evt: str) -> HistoricEventData:
+        return self._events[evt]
+
+    def __iter__(self):
+        return iter(self._events)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+def index_historic_event_files(parquet_dir: Path, events: List[str]) -> Dict[str, HistoricEventStore]:
+    """Scan *parquet_dir* once and build a lazy store per dam scenario."""
+    wanted = set(events)
+    found: Dict[str, Dict[str, Dict[str, Tuple]]] = {'with_dams': {}, 'no_dams': {}}
+    with os.scandir(parquet_dir) as entries:
+        for entry in entries:
+            match = HISTORIC_FILE_PATTERN.match(entry.name)
+            if not match:
+                continue
+            scenario, evt, kind = match.groups()
+            if evt in wanted:
+                found[scenario].setdefault(evt, {})[kind] = ('file', entry.path, entry.stat().st_mtime_ns)
+    return {scenario: HistoricEventStore(evts) for scenario, evts in found.items()}
+
+
+def index_historic_store(store_files: Dict[str, Path]) -> Tuple[List[str], Dict[str, HistoricEventStore]]:
+    """Index the consolidated historic store from its row-group metadata.
+
+    Only the parquet footers are read; returns the event list and a lazy store
+    per dam scenario.
+    """
+    events: Dict[str, None] = {}
+    found: Dict[str, Dict[str, Dict[str, Tuple]]] = {'with_dams': {}, 'no_dams': {}}
+    for kind, path in store_files.items():
+        row_groups = json.loads(pq.read_schema(path).metadata[b'urbs_row_groups'])
+        mtime_ns = path.stat().st_mtime_ns
+        for i, (evt, scenario) in enumerate(row_groups):
+            events.setdefault(evt)
+            found.setdefault(scenario, {}).setdefault(evt, {})[kind] = ('row_group', str(path), i, kind, mtime_ns)
+    return list(events), {scenario: HistoricEventStore(evts) for scenario, evts in found.items()}
+
+
+@st.cache_data(show_spinner="Summarising historic event peaks...")
+def load_historic_peak_summary(data_version: str = "") -> pd.DataFrame:
+    """Peak summary of all historic events, once per data version.
+
+    Read from ``historic_peaks.parquet``, which ingestion and consolidation
+    write (see ``historic_peaks.py``). If it is missing or out of date it is
+    built with an uncached scan that reads one event at a time, so opening an
+    event never loads every event into the shared caches.
+    """
+    historical = load_historical_data(data_version) or {}
+    if any(isinstance(historical.get(s), HistoricEventStore) for s in ('with_dams', 'no_dams')):
+        if peaks_up_to_date(PARQUET_DATA_DIR):
+            peaks = pd.read_parquet(PARQUET_DATA_DIR / PEAKS_FILE)
+        else:
+            peaks = build_stored_peak_summary(PARQUET_DATA_DIR)
+    else:
+        # Legacy pickles: the event tables are in memory already
+        peaks = build_historic_peak_summary(historical)
+    return compact_frame(peaks, 'historic_peak_summary')
+
+
+def normalise_aep_years(values: pd.Series) -> pd.Series:
+    """Convert AEP labels (``100``, ``'1 in 100'``, ``'100y'`` ...) to return
+    periods in years as ``float32``.
+
+    Strings are parsed with a vectorised regex on the last number in the label;
+    categoricals are parsed once per category rather than once per row.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype('float32')
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = normalise_aep_years(pd.Series(values.cat.categories)).to_numpy()
+        # code -1 (missing) picks the trailing NaN
+        lookup = np.append(categories, np.nan).astype('float32')
+        return pd.Series(lookup[values.cat.codes.to_numpy()], index=values.index)
+    numeric = pd.to_numeric(values, errors='coerce')
+    extracted = values.astype(str).str.extract(r'(\d+\.?\d*)\D*$', expand=False)
+    return numeric.fillna(pd.to_numeric(extracted, errors='coerce')).astype('float32')
 
-    # ------------------------------------------------------------------
-    # 1️⃣  Prefer modern parquet files ----------------------------------
-    # ------------------------------------------------------------------
+
+def add_aep_years(df: pd.DataFrame, source_col: str = 'aep') -> pd.DataFrame:
+    """Add the numeric ``aep_years`` column used by all MC AEP filters."""
+    if 'aep_years' not in df.columns and source_col in df.columns:
+        df['aep_years'] = normalise_aep_years(df[source_col])
+    return df
+
+
+def aep_years_of(df: pd.DataFrame) -> pd.Series:
+    """Return ``aep_years`` without modifying *df* (which may be shared)."""
+    return df['aep_years'] if 'aep_years' in df.columns else normalise_aep_years(df['aep'])
+
+
+def sort_design_events(df: pd.DataFrame, columns: Tuple[str, ...]) -> pd.DataFrame:
+    """Sort *df* by *columns* then time so each hydrograph is contiguous."""
+    sort_cols = list(columns) + (['time_hours'] if 'time_hours' in df.columns else [])
+    return df.sort_values(sort_cols, kind='stable', ignore_index=True)
+
+
+def partition_design_events(df: pd.DataFrame, columns: Tuple[str, ...], presorted: bool = False) -> Tuple[pd.DataFrame, Dict[Tuple, slice]]:
+    """Sort *df* by *columns* (then time) and map each value combination to
+    the contiguous row ``slice`` holding its hydrograph.
+
+    Returns the sorted frame and the ``{(aep, location, ...): slice}`` dict, so
+    pulling out one hydrograph is a hash probe plus an ``iloc`` slice. Pass
+    *presorted* when *df* already came from ``sort_design_events`` to avoid a copy.
+    """
+    if not presorted:
+        df = sort_design_events(df, columns)
+    partitions: Dict[Tuple, slice] = {}
+    for key, rows in df.groupby(list(columns), observed=True, sort=True).indices.items():
+        key = tuple(k.item() if isinstance(k, np.generic) else k for k in key)
+        partitions[key] = slice(int(rows[0]), int(rows[-1]) + 1)
+    return df, partitions
+
+
+def build_selection_index(combos: Iterable[Tuple]) -> Dict[Any, Any]:
+    """Build a nested dict of the value combinations in *combos*.
+
+    ``index[aep][location][duration][ensemble]`` holds the available climate
+    scenario codes (as keys of empty dicts) for the MC columns, so every
+    selector can be answered with a few dict lookups instead of a table scan.
+    """
+    index: Dict[Any, Any] = {}
+    for combo in sorted(combos):
+        node = index
+        for value in combo[:-1]:
+            node = node.setdefault(value, {})
+        node[combo[-1]] = {}
+    return index
+
+
+def lookup_selection_index(index: Dict[Any, Any], *selections: Any) -> List[Any]:
+    """Return the sorted values available at the level below *selections*.
+
+    A ``None`` selection acts as a wildcard and merges all branches at that level.
+    """
+    nodes = [index]
+    for value in selections:
+        if value is None:
+            nodes = [child for node in nodes for child in node.values()]
+        else:
+            nodes = [node[value] for node in nodes if value in node]
+    keys = set()
+    for node in nodes:
+        keys.update(node)
+    return sorted(keys)
+
+
+def build_design_mc_table(mc_path: Path) -> pd.DataFrame:
+    """Read ``design_mc.parquet`` into its compact, sorted in-memory layout."""
+    df_mc = pd.read_parquet(mc_path)
+    # Ensure categorical/text columns keep small memory footprint
+    cat_cols = [c for c in df_mc.select_dtypes(include=["object", "string"]).columns if c not in ["datetime"]]
+    for c in cat_cols:
+        df_mc[c] = df_mc[c].astype("category")
+    add_aep_years(df_mc)
+    df_mc = compact_frame(df_mc, 'design_MC')
+    if set(MC_INDEX_COLUMNS).issubset(df_mc.columns):
+        df_mc = sort_design_events(df_mc, MC_INDEX_COLUMNS)
+    return df_mc
+
+
+def prepare_design_mc(design_mc: Dict[str, Any], presorted: bool = False) -> Dict[str, Any]:
+    """Add ``aep_years``, the hydrograph partitions and the selection index to
+    a ``{'design_events': DataFrame}`` MC entry (in place)."""
+    df = design_mc.get('design_events')
+    if not isinstance(df, pd.DataFrame):
+        return design_mc
+    add_aep_years(df)
+    if set(MC_INDEX_COLUMNS).issubset(df.columns):
+        df, partitions = partition_design_events(df, MC_INDEX_COLUMNS, presorted=presorted)
+        design_mc['design_events'] = df
+        design_mc['partitions'] = partitions
+        design_mc['selection_index'] = build_selection_index(partitions)
+    return design_mc
+
+
+def get_mc_selection_index(data: Mapping) -> Dict[Any, Any]:
+    """Return the MC selection index built at load time (empty if the MC
+    table lacks the selector columns)."""
+    design_mc = data.get('design_MC') or {}
+    return design_mc.get('selection_index', {})
+
+
+def load_design_mc_dataset(dataset_dir: Path, data_version: str = "") -> Dict[str, Any]:
+    """Index a partitioned MC dataset without loading its hydrographs.
+
+    Only the selector columns are read (``columns=`` pushdown) to build the
+    selection index; ``design_events`` then lists the available combinations
+    and hydrographs are read per selection by ``read_design_mc_selection``.
+    """
+    key_cols = ['aep'] + [c for c in MC_INDEX_COLUMNS if c != 'aep_years']
+    keys = add_aep_years(pd.read_parquet(dataset_dir, columns=key_cols))
+    combos = keys.groupby(list(MC_INDEX_COLUMNS) + ['aep'], observed=True, sort=True).size().rename('rows').reset_index()
+    return {
+        'design_events': combos,
+        'dataset': str(dataset_dir),
+        'data_version': data_version,
+        'selection_index': build_selection_index(combos[list(MC_INDEX_COLUMNS)].itertuples(index=False, name=None)),
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def read_design_mc_selection(dataset: str, filters: Tuple[Tuple[str, str, Any], ...], data_version: str = "") -> pd.DataFrame:
+    """Read the rows of a partitioned MC dataset matching *filters*.
+
+    The filters are pushed down to pyarrow, which prunes ``aep=`` partitions and
+    skips row groups whose statistics cannot match, so only the selected
+    hydrograph is decoded. *data_version* only keys the cache.
+    """
+    df = pd.read_parquet(dataset, filters=list(filters) or None)
+    sort_cols = [c for c in MC_INDEX_COLUMNS if c != 'aep_years'] + ['time_hours']
+    return add_aep_years(df).sort_values([c for c in sort_cols if c in df.columns], ignore_index=True)
+
+
+def get_mc_hydrograph(data: Dict[str, Any], aep, location, duration, ensemble, climate_scenario=None) -> Optional[pd.DataFrame]:
+    """Return the MC rows for one hydrograph via the precomputed partitions.
+
+    A ``None`` duration, ensemble or climate scenario selects every value, so
+    the same call returns a whole batch of hydrographs (e.g. all ensembles of
+    an AEP and location); adjacent partitions are read as a single slice. For
+    a partitioned dataset the selection is read with filter pushdown instead.
+    Returns ``None`` when neither is available so callers can fall back to
+    filtering the table.
+    """
+    design_mc = data.get('design_MC') or {}
+    if 'dataset' in design_mc:
+        aep_val = float(aep)
+        filters = [('aep', '=', int(aep_val) if aep_val.is_integer() else aep_val), ('location', '=', location)]
+        if duration is not None:
+            filters.append(('duration', '=', duration))
+        if ensemble is not None:
+            filters.append(('ensemble', '=', ensemble))
+        if climate_scenario and climate_scenario != "Select a scenario":
+            filters.append(('climate_scenario_code', '=', climate_scenario))
+        return read_design_mc_selection(design_mc['dataset'], tuple(filters), design_mc.get('data_version', ""))
+    partitions = design_mc.get('partitions')
+    if not partitions:
+        return None
+    df = design_mc['design_events']
+    if climate_scenario == "Select a scenario":
+        climate_scenario = None
+    keys = [(float(aep), location)]
+    for value in (duration, ensemble, climate_scenario):
+        keys = [
+            key + (v,)
+            for key in keys
+            for v in ([value] if value is not None else lookup_selection_index(design_mc['selection_index'], *key))
+        ]
+    slices = sorted((partitions[key] for key in keys if key in partitions), key=lambda sl: sl.start)
+    if not slices:
+        return df.iloc[0:0]
+    merged = [slices[0]]
+    for sl in slices[1:]:
+        if sl.start == merged[-1].stop:
+            merged[-1] = slice(merged[-1].start, sl.stop)
+        else:
+            merged.append(sl)
+    if len(merged) == 1:
+        return df.iloc[merged[0]]
+    return pd.concat([df.iloc[sl] for sl in merged])
+
+
+def summarise_design_batch(df: pd.DataFrame, flow_col: str = 'flow_rate') -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Peak statistics for a batch of MC hydrographs, all via grouped reductions.
+
+    Returns ``(peaks, stats)``: the peak flow and time of peak of every
+    (climate scenario, duration, ensemble) hydrograph, and per duration the
+    spread of the ensemble peaks, the member nearest the median peak and a
+    ``critical`` flag on the duration with the highest median peak (per
+    climate scenario).
+    """
+    member_cols = [c for c in ('climate_scenario_code', 'duration', 'ensemble') if c in df.columns]
+    df = df.dropna(subset=[flow_col]).reset_index(drop=True)
+    grouped = df.groupby(member_cols, observed=True, sort=True)[flow_col]
+    peaks = grouped.max().rename('peak_flow').to_frame()
+    peaks['peak_time_hours'] = df['time_hours'].to_numpy()[grouped.idxmax().to_numpy()]
+
+    by = [c for c in member_cols if c != 'ensemble']
+    if not by or 'ensemble' not in member_cols:
+        return peaks, pd.DataFrame()
+    by_peak = peaks.groupby(level=by, observed=True)['peak_flow']
+    stats = by_peak.agg(['count', 'min', 'median', 'mean', 'max'])
+    deviation = (peaks['peak_flow'] - by_peak.transform('median')).abs()
+    stats['median_ensemble'] = [key[-1] for key in deviation.groupby(level=by, observed=True).idxmin()]
+    scenario_levels = [c for c in by if c != 'duration']
+    if scenario_levels:
+        best = stats.groupby(level=scenario_levels, observed=True)['median'].transform('max')
+    else:
+        best = stats['median'].max()
+    stats['critical'] = stats['median'] == best
+    return peaks, stats
+
+
+def summarise_mc_peaks(df: pd.DataFrame) -> pd.DataFrame:
+    """Peak flow (and peak level, where modelled) of every MC realisation,
+    i.e. every (AEP, location, duration, ensemble, climate scenario)
+    hydrograph, in one grouped pass over the whole table."""
+    sources = {'peak_flow': 'qts' if 'qts' in df.columns else 'flow_rate', 'peak_level': 'hts'}
+    sources = {name: col for name, col in sources.items() if col in df.columns}
+    group_cols = [c for c in MC_INDEX_COLUMNS if c in df.columns]
+    peaks = df.groupby(group_cols, observed=True, sort=True)[list(sources.values())].max()
+    return peaks.rename(columns={col: name for name, col in sources.items()}).reset_index()
+
+
+@st.cache_data(show_spinner="Computing Monte Carlo peaks...")
+def load_mc_peaks(data_version: str = "") -> pd.DataFrame:
+    """``summarise_mc_peaks`` over the loaded MC data, once per data version.
+
+    For a partitioned dataset only the selector and flow/level columns are read.
+    """
+    design_mc = load_design_mc_data(data_version) or {}
+    if 'dataset' in design_mc:
+        first_file = next(Path(design_mc['dataset']).rglob('*.parquet'))
+        available = set(pq.read_schema(first_file).names) | {'aep'}
+        columns = [c for c in ('aep', *MC_INDEX_COLUMNS, 'flow_rate', 'qts', 'hts') if c in available]
+        df = add_aep_years(pd.read_parquet(design_mc['dataset'], columns=columns))
+    else:
+        df = design_mc.get('design_events')
+    if df is None or df.empty:
+        return pd.DataFrame()
+    return summarise_mc_peaks(df)
+
+
+@st.cache_data(show_spinner=False)
+def build_frequency_curves(peaks: pd.DataFrame, lower: float = 0.1, upper: float = 0.9) -> pd.DataFrame:
+    """Empirical AEP curves from the MC realisation peaks.
+
+    For every location, climate scenario and AEP the peaks of all realisations
+    (durations x ensembles) are reduced to their median and the *lower* /
+    *upper* quantiles, giving a curve with a confidence band. Returns one row
+    per (metric, location, climate scenario, AEP).
+    """
+    by = [c for c in ('location', 'climate_scenario_code', 'aep_years') if c in peaks.columns]
+    curves = []
+    for metric in (c for c in ('peak_flow', 'peak_level') if c in peaks.columns):
+        grouped = peaks.dropna(subset=[metric]).groupby(by, observed=True, sort=True)[metric]
+        quantiles = grouped.quantile([lower, 0.5, upper]).unstack()
+        quantiles.columns = ['lower', 'median', 'upper']
+        curve = pd.concat([grouped.agg(['count', 'min']), quantiles, grouped.max().rename('max')], axis=1)
+        curve.insert(0, 'metric', metric)
+        curves.append(curve.reset_index())
+    if not curves:
+        return pd.DataFrame()
+    curves = pd.concat(curves, ignore_index=True)
+    curves['aep_pct'] = 100.0 / curves['aep_years']
+    return curves
+
+
+def freeze_table(table: Any) -> Any:
+    """Wrap one loaded table in a read-only mapping so that the shared copy
+    cannot be modified by one session on behalf of all others."""
+    if isinstance(table, dict):
+        return MappingProxyType({k: tuple(v) if isinstance(v, list) else v for k, v in table.items()})
+    return table
+
+
+@st.cache_resource(show_spinner="Loading Monte Carlo design data...", max_entries=1)
+def load_design_mc_data(data_version: str = "") -> Optional[Mapping]:
+    """The ``design_MC`` table: ``data_parquet/design_mc/`` (indexed only),
+    ``design_mc.parquet`` or the legacy pickle. *data_version* only keys the cache."""
+    design_mc = None
     try:
-        if PARQUET_DATA_DIR.exists():
-            # ---- Monte-Carlo design events ---------------------------------
-            mc_path = PARQUET_DATA_DIR / "design_mc.parquet"
-            if mc_path.exists():
-                df_mc = pd.read_parquet(mc_path)
-                # Ensure categorical/text columns keep small memory footprint
-                cat_cols = [c for c in df_mc.select_dtypes(include="object").columns if c not in ["datetime"]]
-                for c in cat_cols:
-                    df_mc[c] = df_mc[c].astype("category")
-                data['design_MC'] = {'design_events': df_mc}
-
-            # ---- B15 design events ----------------------------------------
-            b15_path = PARQUET_DATA_DIR / "design_b15.parquet"
-            if b15_path.exists():
-                df_b15 = pd.read_parquet(b15_path)
-                # Replace sentinel -99999 with NaN across all numeric cols
-                num_cols = df_b15.select_dtypes(include=['number']).columns
-                df_b15[num_cols] = df_b15[num_cols].replace(-99999, np.nan)
-                # Harmonise column names with the rest of the app
-                rename_map = {
-                    'Location': 'location',
-                    'flow': 'flow_rate',
-                }
-                df_b15 = df_b15.rename(columns=rename_map)
-                if 'AEP_Value' in df_b15.columns:
-                     # Convert probability (e.g., 0.01) to return-period years (e.g., 100)
-                     df_b15['AEP_Years'] = (1.0 / df_b15['AEP_Value']).round(0).astype('Int64')
-                data['design_B15'] = {'design_events': df_b15}
+        mc_path = PARQUET_DATA_DIR / "design_mc.parquet"
+        if DESIGN_MC_DATASET_DIR.is_dir():
+            # Partitioned layout: index only, hydrographs read on demand
+            design_mc = load_design_mc_dataset(DESIGN_MC_DATASET_DIR, data_version)
+        elif mc_path.exists():
+            df_mc = read_with_arrow_cache("design_mc", [mc_path], lambda: build_design_mc_table(mc_path))
+            design_mc = prepare_design_mc({'design_events': df_mc}, presorted=True)
+    except Exception as e:
+        st.warning(f"Parquet loading failed – falling back to pickles.\n{e}")
+
+    try:
+        if design_mc is None:
+            pkl_mc = PACKAGED_DATA_DIR / "DESIGN_URBS_packaged_j_drive_data.pkl.gz"
+            if pkl_mc.exists():
+                with gzip.open(pkl_mc, 'rb') as f:
+                    design_mc = pickle.load(f)
+                    if isinstance(design_mc, pd.DataFrame):
+                        design_mc = {'design_events': compact_frame(design_mc, 'design_MC')}
+                    prepare_design_mc(design_mc)
+    except Exception as e:
+        st.error(f"Error while loading legacy packaged data: {e}")
+    return freeze_table(design_mc)
+
+
+@st.cache_resource(show_spinner="Loading B15 design data...", max_entries=1)
+def load_design_b15_data(data_version: str = "") -> Optional[Mapping]:
+    """The ``design_B15`` table from ``design_b15.parquet`` or the legacy pickle.
+    *data_version* only keys the cache."""
+    design_b15 = None
+    try:
+        b15_path = PARQUET_DATA_DIR / "design_b15.parquet"
+        if b15_path.exists():
+            df_b15 = pd.read_parquet(b15_path)
+            # Replace sentinel -99999 with NaN across all numeric cols
+            num_cols = df_b15.select_dtypes(include=['number']).columns
+            df_b15[num_cols] = df_b15[num_cols].replace(-99999, np.nan)
+            # Harmonise column names with the rest of the app
+            rename_map = {
+                'Location': 'location',
+                'flow': 'flow_rate',
+            }
+            df_b15 = df_b15.rename(columns=rename_map)
+            if 'AEP_Value' in df_b15.columns:
+                 # Convert probability (e.g., 0.01) to return-period years (e.g., 100)
+                 df_b15['AEP_Years'] = (1.0 / df_b15['AEP_Value']).round(0).astype('Int64')
+            design_b15 = {'design_events': compact_frame(df_b15, 'design_B15')}
+    except Exception as e:
+        st.warning(f"Parquet loading failed – falling back to pickles.\n{e}")
+
+    try:
+        if design_b15 is None:
+            pkl_b15 = PACKAGED_DATA_DIR / "DESIGN_B15_flow_timeseries_2030_SSP2.pkl"
+            if pkl_b15.exists():
+                with open(pkl_b15, 'rb') as f:
+                    loaded_b15 = pickle.load(f)
+                if isinstance(loaded_b15, pd.DataFrame):
+                    design_b15 = {'design_events': compact_frame(loaded_b15, 'design_B15')}
+                else:
+                    design_b15 = loaded_b15  # assume already nested
+    except Exception as e:
+        st.error(f"Error while loading legacy packaged data: {e}")
+    return freeze_table(design_b15)
+
 
-            # ---- Historical runs -----------------------------------------
+@st.cache_resource(show_spinner="Indexing historic events...", max_entries=1)
+def load_historical_data(data_version: str = "") -> Optional[Mapping]:
+    """The ``historical`` table: lazy ``HistoricEventStore`` indexes of the
+    per-event files or the consolidated store, or the legacy pickle.
+    *data_version* only keys the cache."""
+    historical = None
+    try:
+        if PARQUET_DATA_DIR.exists():
             hist_events_p = PARQUET_DATA_DIR / "HISTORICAL_packaged_data_historic_events.parquet"
-            if hist_events_p.exists():
+            stores = None
+            if all(p.exists() for p in HISTORIC_STORE_FILES.values()):
+                # Consolidated store: two files, one row group per event
+                historic_events_list, stores = index_historic_store(HISTORIC_STORE_FILES)
+            elif hist_events_p.exists():
                 hist_events_df = pd.read_parquet(hist_events_p)
                 # The parquet is just a single unnamed column – grab the values
                 historic_events_list = hist_events_df.iloc[:, 0].astype(str).tolist()
             else:
                 historic_events_list = []
 
-            # Build nested dictionaries for each historic event using the new per-event parquet files
+            # Index the per-event parquet files; each event is only read when
+            # it is first selected in the Historic Events page
             if historic_events_list:
-                with_dams_dict = {}
-                no_dams_dict = {}
-                for evt in historic_events_list:
-                    evt = str(evt).strip()
-                    # --- with dams ---
-                    p_params = PARQUET_DATA_DIR / f"historic_with_dams_{evt}_params.parquet"
-                    p_ts     = PARQUET_DATA_DIR / f"historic_with_dams_{evt}_timeseries.parquet"
-                    evt_dict: Dict[str, Any] = {}
-                    if p_params.exists():
-                        evt_dict['params'] = pd.read_parquet(p_params)
-                    if p_ts.exists():
-                        evt_dict['timeseries'] = pd.read_parquet(p_ts)
-                    if evt_dict:
-                        with_dams_dict[evt] = evt_dict
-                    # --- no dams ---
-                    p_params_nd = PARQUET_DATA_DIR / f"historic_no_dams_{evt}_params.parquet"
-                    p_ts_nd     = PARQUET_DATA_DIR / f"historic_no_dams_{evt}_timeseries.parquet"
-                    evt_nd_dict: Dict[str, Any] = {}
-                    if p_params_nd.exists():
-                        evt_nd_dict['params'] = pd.read_parquet(p_params_nd)
-                    if p_ts_nd.exists():
-                        evt_nd_dict['timeseries'] = pd.read_parquet(p_ts_nd)
-                    if evt_nd_dict:
-                        no_dams_dict[evt] = evt_nd_dict
-                data['historical'] = {
+                historic_events_list = [str(evt).strip() for evt in historic_events_list]
+                if stores is None:
+                    stores = index_historic_event_files(PARQUET_DATA_DIR, historic_events_list)
+                historical = {
                     'historic_events': historic_events_list,
-                    'with_dams': with_dams_dict,
-                    'no_dams': no_dams_dict,
+                    'with_dams': stores['with_dams'],
+                    'no_dams': stores['no_dams'],
                 }
             else:
                 # Ensure 'historical' key exists to prevent NoneType errors downstream
-                data['historical'] = {
+                historical = {
                     'historic_events': [],
                     'with_dams': {},
                     'no_dams': {},
                 }
-
-
     except Exception as e:
         st.warning(f"Parquet loading failed – falling back to pickles.\n{e}")
 
-    # ------------------------------------------------------------------
-    # 2️⃣  Fallback to legacy pickles ------------------------------------
-    # ------------------------------------------------------------------
-    # Only attempt the expensive pickle load if the above keys are still None
     try:
-        if data['design_MC'] is None or data['design_B15'] is None or data['historical'] is None:
-            PACKAGED_DATA_DIR.mkdir(exist_ok=True)
-
-        # -- Monte-Carlo ---------------------------------------------------
-        if data['design_MC'] is None:
-            pkl_mc = PACKAGED_DATA_DIR / "DESIGN_URBS_packaged_j_drive_data.pkl.gz"
-            if pkl_mc.exists():
-                with gzip.open(pkl_mc, 'rb') as f:
-                    data['design_MC'] = pickle.load(f)
-                    if isinstance(data['design_MC'], pd.DataFrame):
-                        data['design_MC'] = {'design_events': data['design_MC']}
-
-        # -- B15 -----------------------------------------------------------
-        if data['design_B15'] is None:
-            pkl_b15 = PACKAGED_DATA_DIR / "DESIGN_B15_flow_timeseries_2030_SSP2.pkl"
-            if pkl_b15.exists():
-                with open(pkl_b15, 'rb') as f:
-                    loaded_b15 = pickle.load(f)
-                if isinstance(loaded_b15, pd.DataFrame):
-                    data['design_B15'] = {'design_events': loaded_b15}
-                else:
-                    data['design_B15'] = loaded_b15  # assume already nested
-
-        # -- Historical ----------------------------------------------------
-        if data['historical'] is None:
+        if historical is None:
             pkl_hist = PACKAGED_DATA_DIR / "HISTORICAL_packaged_data.pkl.gz"
             if pkl_hist.exists():
                 with gzip.open(pkl_hist, 'rb') as f:
-                    data['historical'] = pickle.load(f)
-
+                    historical = pickle.load(f)
+                for scenario in ('with_dams', 'no_dams'):
+                    for evt_data in historical.get(scenario, {}).values():
+                        if 'timeseries' in evt_data:
+                            evt_data['timeseries'] = index_historic_timeseries(evt_data['timeseries'])
     except Exception as e:
         st.error(f"Error while loading legacy packaged data: {e}")
+    return freeze_table(historical)
+
+
+# Table name -> cached loader of load_packaged_data
+PACKAGED_TABLE_LOADERS = {
+    'historical': load_historical_data,
+    'design_MC': load_design_mc_data,
+    'design_B15': load_design_b15_data,
+}
 
-    return data
 
-def get_available_models(data: Dict[str, Any]) -> List[Tuple[str, str]]:
+def load_packaged_data(data_versions: Optional[Mapping[str, str]] = None) -> Mapping:
+    """Load model datasets from either **data_parquet** (preferred) or legacy
+    **packaged_data** pickles so that the rest of the interface continues to
+    work unchanged.
+
+    The function builds a nested dict with the expected keys/structure:
+        data = {
+            'historical': {
+                'historic_events': List[str],
+                'with_dams': {event_id: {'params': DataFrame, 'timeseries': DataFrame}},
+                'no_dams' :  { ... same structure ... }
+            },
+            'design_MC':  {'design_events': DataFrame, 'partitions': dict, 'selection_index': dict},
+            'design_B15': {'design_events': DataFrame}
+        }
+    Only the pieces that can be found are populated; missing parts are kept as
+    ``None`` so that calling code can degrade gracefully.
+
+    If ``data_parquet/design_mc/`` holds a partitioned dataset (see
+    ``partition_design_mc.py``) it is used instead of ``design_mc.parquet`` and
+    only its selector columns are loaded up front.
+
+    Each table comes from its own loader (``PACKAGED_TABLE_LOADERS``), cached
+    with ``st.cache_resource`` under the version of that table's files
+    (*data_versions*, default ``get_data_versions()``). Every table is a
+    single read-only object shared by every session until its files change,
+    so memory does not grow with the number of users and an ingest that
+    writes one table does not reload the others. Callers must not modify the
+    returned frames.
+
+    The historic ``with_dams``/``no_dams`` entries are ``HistoricEventStore``
+    mappings: the directory (or the consolidated store written by
+    ``consolidate_historic_events.py``) is indexed here, but each event's
+    tables are only read when that event is first accessed.
+    """
+    data_versions = data_versions or get_data_versions()
+    return MappingProxyType({
+        table: loader(data_versions.get(table, ""))
+        for table, loader in PACKAGED_TABLE_LOADERS.items()
+    })
+
+def get_packaged_data() -> Mapping:
+    """Return the shared, read-only packaged data, reloading a table only when
+    its files in ``data_parquet/`` have changed."""
+    return load_packaged_data(get_data_versions())
+
+
+def clear_data_caches():
+    """Admin action: drop the shared packaged data and every data cache."""
+    st.cache_data.clear()
+    for loader in PACKAGED_TABLE_LOADERS.values():
+        loader.clear()
+    get_memory_report().clear()
+
+
+def get_available_models(data: Mapping) -> List[Tuple[str, str]]:
     """Get list of available models from the loaded data, ensuring they have valid data."""
     models = []
     
     # Check for URBS Monte Carlo Design Runs
     design_mc_data = data.get('design_MC', {})
-    if isinstance(design_mc_data, dict):
+    if isinstance(design_mc_data, Mapping):
         df_mc = design_mc_data.get('design_events')
         if isinstance(df_mc, pd.DataFrame) and not df_mc.empty:
             models.append(('URBS Monte Carlo Design Runs', 'design_MC'))
@@ -188,12 +849,10 @@ def get_available_models(data: Dict[str, Any]) -> List[Tuple[str, str]]:
     design_b15_data = data.get('design_B15')
     if design_b15_data:
         df_b15 = None
-        if isinstance(design_b15_data, dict):
+        if isinstance(design_b15_data, Mapping):
             df_b15 = design_b15_data.get('design_events')
         elif isinstance(design_b15_data, pd.DataFrame):
             df_b15 = design_b15_data
-            # Ensure data is stored in the consistent dict structure
-            data['design_B15'] = {'design_events': df_b15}
         
         if isinstance(df_b15, pd.DataFrame) and not df_b15.empty:
             # Avoid adding duplicates
@@ -205,8 +864,11 @@ def get_available_models(data: Dict[str, Any]) -> List[Tuple[str, str]]:
 def get_available_aeps(data: Dict[str, Any], model_type: str) -> List[float]:
     """Get available AEPs for the selected model type."""
     if model_type == 'design_MC':
+        mc_index = get_mc_selection_index(data)
+        if mc_index:
+            return [float(aep) for aep in lookup_selection_index(mc_index)]
         df = data.get('design_MC', {}).get('design_events')
-        aep_col = 'aep'
+        aep_col = 'aep_years' if df is not None and 'aep_years' in df.columns else 'aep'
     elif model_type == 'design_B15':
         df = data.get('design_B15', {}).get('design_events')
         # Prefer the years column if it exists, else use probability
@@ -218,18 +880,9 @@ def get_available_aeps(data: Dict[str, Any], model_type: str) -> List[float]:
         return []
 
     try:
-        raw_aeps = df[aep_col].dropna().unique()
-        aeps = set()
-        for val in raw_aeps:
-            if isinstance(val, str):
-                # Extract numbers from strings like '1 in 100'
-                numbers = re.findall(r'\d+\.?\d*', val)
-                if numbers:
-                    aeps.add(float(numbers[-1]))
-            elif isinstance(val, (int, float, np.number)):
-                aeps.add(float(val))
-        
-        return sorted(list(aeps))
+        # Extract numbers from labels like '1 in 100' in one vectorised pass
+        aeps = normalise_aep_years(pd.Series(df[aep_col].dropna().unique())).dropna().unique()
+        return sorted(float(a) for a in aeps)
     except Exception as e:
         st.error(f"An error occurred while processing AEP values: {e}")
         return []
@@ -257,7 +910,10 @@ def get_available_locations(data: Dict[str, Any], model_type: str, selected_aep:
     locations = set()
     
     df = None
-    if model_type == 'design_MC':
+    mc_index = get_mc_selection_index(data) if model_type == 'design_MC' else {}
+    if mc_index:
+        locations.update(lookup_selection_index(mc_index, selected_aep))
+    elif model_type == 'design_MC':
         df = data.get('design_MC', {}).get('design_events')
     elif model_type == 'design_B15':
         df = data.get('design_B15', {}).get('design_events')
@@ -273,8 +929,13 @@ def get_available_locations(data: Dict[str, Any], model_type: str, selected_aep:
         
     return [("Select a location", "")] + display_locations
 
-def get_available_climate_scenarios(data):
-    """Extracts available climate scenarios from the MC design data."""
+def get_available_climate_scenarios(data, aep=None, location=None, duration=None, ensemble=None):
+    """Extracts available climate scenarios from the MC design data, narrowed to
+    the upstream selections that have been made."""
+    mc_index = get_mc_selection_index(data)
+    if mc_index:
+        codes = lookup_selection_index(mc_index, aep or None, location or None, duration, ensemble)
+        return ["Select a scenario"] + codes if codes else []
     df = data.get('design_MC', {}).get('design_events')
     if df is not None and 'climate_scenario_code' in df.columns:
         # Add a default option
@@ -349,6 +1010,64 @@ def get_available_ensembles(data, aep, location):
     return []
 
 
+# --- URBS Job Queue ---
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """The URBS job queue of this app process; its dispatcher threads start on first use.
+
+    Runs repeating a stored result (same selection, switches and model input
+    files) finish immediately without launching URBS.
+    """
+    return JobQueue().start()
+
+
+def show_job_progress(job_id: Optional[str], complete_flag: str):
+    """Show the status of an URBS job.
+
+    A queued or running job is polled by ``poll_job_progress`` without
+    rerunning the page. Once it has finished, a successful job sets
+    ``st.session_state[complete_flag]`` and reruns the page so the caller can
+    display the results; a failed or cancelled one is shown here, outside the
+    polling fragment, so nothing keeps polling the job database.
+    """
+    job = get_job_queue().get(job_id) if job_id else None
+    if job is None:
+        st.warning("No URBS run found – click 'Run URBS' to start one.")
+        return
+
+    status = job['status']
+    if status == 'done':
+        st.session_state[complete_flag] = True
+        st.rerun()
+    elif status == 'failed':
+        st.error(f"URBS run failed (exit code {job['returncode']}): {job['message']}")
+        if job['workdir']:
+            st.caption(f"Console output: `{Path(job['workdir']) / 'urbsout.log'}`")
+    elif status == 'cancelled':
+        st.warning("URBS run cancelled.")
+    else:
+        poll_job_progress(job_id, complete_flag)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_job_progress(job_id: str, complete_flag: str):
+    """Progress of a queued or running URBS job; reruns the page once it finishes."""
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None or job['status'] in FINAL_STATUSES:
+        if job is not None and job['status'] == 'done':
+            st.session_state[complete_flag] = True
+        st.rerun()
+
+    if job['status'] == 'queued':
+        text = f"Queued – {queue.position(job_id)} run(s) ahead"
+    else:
+        text = f"Model running… {job['message']}"
+    st.progress(min(job['progress'], 1.0), text=text)
+    if st.button("⏹ Cancel run", key=f"cancel_{job_id}"):
+        queue.cancel(job_id)
+
+
 def show_historic_event_ui(data, col1, col2):
     """UI and results display for historic calibration events."""
     # Sidebar debug toggle
@@ -381,8 +1100,15 @@ def show_historic_event_ui(data, col1, col2):
             st.session_state.show_historic_results = False
             st.session_state.historic_run_complete = False
 
-        # Run button -> simulate model run
+        # Run button -> queue an URBS run for the event
         if st.button("▶️ Run URBS", use_container_width=True, key="run_historic", type="primary"):
+            st.session_state.historic_job_id = get_job_queue().submit(
+                'historic', {
+                    'event': selected_event,
+                    'no_dams': show_no_dams,
+                    'switch': st.session_state.get('urbs_switch', URBS_SWITCHES[0]),
+                }
+            )
             st.session_state.historic_run_key = selected_event
             st.session_state.show_historic_results = True
             st.session_state.historic_run_complete = False
@@ -408,12 +1134,10 @@ def show_historic_event_ui(data, col1, col2):
     with col2:
         st.header("Event Data Analysis")
         if st.session_state.get('show_historic_results', False):
-            # Simulate running time only once per run
+            # Results are shown once the queued URBS job has finished
             if not st.session_state.get('historic_run_complete', False):
-                with st.spinner("Model running..."):
-                    time.sleep(4)
-                    st.session_state.historic_run_complete = True
-                    st.rerun()
+                show_job_progress(st.session_state.get('historic_job_id'), 'historic_run_complete')
+                return
 
             event = st.session_state.historic_run_key
             st.success(f"Displaying data for Historic Event: **{event}**")
@@ -443,6 +1167,8 @@ def show_historic_event_ui(data, col1, col2):
                     # Build a quick summary table of each event
                     summary_rows = []
                     for evt_key, evt_val in with_dams_dict.items():
+                        if not getattr(evt_val, 'is_loaded', True):
+                            continue  # don't force a read of every event just for debugging
                         params_shape = evt_val.get('params', pd.DataFrame()).shape
                         ts_shape = evt_val.get('timeseries', pd.DataFrame()).shape
                         summary_rows.append({
@@ -458,49 +1184,71 @@ def show_historic_event_ui(data, col1, col2):
                         st.info("No with_dams event data found.")
                 return
 
-            tab1, tab2 = st.tabs(["📈 Time Series", "📊 Peak Flows"])
+            tab1, tab2, tab3 = st.tabs(["📈 Time Series", "📊 Peak Flows", "🏆 Compare Events"])
 
             # --- Time-series tab ---
             with tab1:
                 st.subheader("Flow Time Series Analysis")
-                all_locs = sorted({c.split(' (')[0] for c in timeseries_data.columns if isinstance(c, str)})
+                all_locs = sorted(timeseries_data.columns.unique(level='location'))
                 selected_loc = st.selectbox("Select Location to Plot:", all_locs, key="historic_loc_selector")
 
                 if selected_loc:
-                    plot_df = pd.DataFrame(index=timeseries_data.index)
-                    if f"{selected_loc} (R)" in timeseries_data:
-                        plot_df['Recorded'] = timeseries_data[f"{selected_loc} (R)"]
-                    if f"{selected_loc} (C)" in timeseries_data:
-                        plot_df['Modelled (With Dams)'] = timeseries_data[f"{selected_loc} (C)"]
-                    if not nodam_timeseries_data.empty and f"{selected_loc} (C)" in nodam_timeseries_data:
-                        plot_df['Modelled (No Dams)'] = nodam_timeseries_data[f"{selected_loc} (C)"]
+                    frames = {'with_dams': timeseries_data, 'no_dams': nodam_timeseries_data}
+                    plot_df = pd.DataFrame({
+                        label: frames[scenario][(selected_loc, series)]
+                        for (scenario, series), label in HISTORIC_SERIES_LABELS.items()
+                        if (selected_loc, series) in frames[scenario].columns
+                    })
                     if not plot_df.empty:
-                        st.line_chart(plot_df)
+                        show_line_chart(plot_df, key="historic_chart")
 
             # --- Peak-flows tab ---
+            peak_summary = load_historic_peak_summary(get_data_version('historical'))
+            if not show_no_dams:
+                peak_summary = peak_summary[peak_summary['series'] != 'Modelled (No Dams)']
+            series_order = [s for s in HISTORIC_SERIES_LABELS.values() if s in set(peak_summary['series'])]
+
             with tab2:
                 st.subheader("Peak Flows at Key Locations")
-                numeric_ts_data = timeseries_data.select_dtypes(include='number')
-                summary_df = pd.concat(
-                    [
-                        numeric_ts_data.filter(like='(R)').max().rename('Recorded'),
-                        numeric_ts_data.filter(like='(C)').max().rename('Modelled (With Dams)'),
-                    ],
-                    axis=1,
+                metric = st.radio("Statistic", list(PEAK_METRICS), horizontal=True, key="historic_peak_metric")
+                event_peaks = peak_summary[peak_summary['event_id'] == event]
+                summary_df = (
+                    event_peaks.pivot_table(index='location', columns='series', values=PEAK_METRICS[metric],
+                                            observed=True, sort=False)
+                    .reindex(columns=[s for s in series_order if s in set(event_peaks['series'])])
                 )
-
-                if not nodam_timeseries_data.empty:
-                    nodam_peaks = (
-                        nodam_timeseries_data.select_dtypes(include='number')
-                        .filter(like='(C)')
-                        .max()
-                        .rename('Modelled (No Dams)')
-                    )
-                    summary_df = pd.concat([summary_df, nodam_peaks], axis=1)
-
                 summary_df.index.name = 'Location'
-                summary_df.index = summary_df.index.str.replace(r' \(R\)| \(C\)', '', regex=True).str.strip()
+                summary_df.columns.name = None
                 st.dataframe(summary_df.dropna(how='all').round(1), use_container_width=True)
+
+            # --- Cross-event comparison tab ---
+            with tab3:
+                st.subheader("Compare Historic Events")
+                locations = sorted(peak_summary['location'].astype(str).unique())
+                if not locations:
+                    st.info("No peak-flow summary available.")
+                else:
+                    c1, c2, c3 = st.columns(3)
+                    cmp_loc = c1.selectbox("Location", locations, key="historic_compare_loc")
+                    cmp_series = c2.selectbox("Rank by", series_order, key="historic_compare_series")
+                    cmp_metric = c3.selectbox("Statistic", list(PEAK_METRICS), key="historic_compare_metric")
+
+                    ranking = (
+                        peak_summary[peak_summary['location'] == cmp_loc]
+                        .pivot_table(index='event_id', columns='series', values=PEAK_METRICS[cmp_metric],
+                                     observed=True, sort=False)
+                        .reindex(columns=series_order)
+                        .dropna(subset=[cmp_series])
+                        .sort_values(cmp_series, ascending=False)
+                    )
+                    ranking.index.name = 'Event'
+                    ranking.columns.name = None
+                    ranking.insert(0, 'Rank', np.arange(1, len(ranking) + 1))
+                    if event in ranking.index:
+                        st.caption(f"Event **{event}** ranks {int(ranking.at[event, 'Rank'])} of {len(ranking)} "
+                                   f"at {cmp_loc} ({cmp_series}).")
+                    st.bar_chart(ranking[cmp_series])
+                    st.dataframe(ranking.round(1), use_container_width=True)
         else:
             st.info("👈 Select a historic event and click 'Run URBS' to display results.")
 
@@ -510,6 +1258,8 @@ def show_historic_event_ui(data, col1, col2):
                 # Summary of all event data
                 summary_rows = []
                 for evt_key, evt_val in with_dams_dict.items():
+                    if not getattr(evt_val, 'is_loaded', True):
+                        continue
                     params_shape = evt_val.get('params', pd.DataFrame()).shape
                     ts_shape = evt_val.get('timeseries', pd.DataFrame()).shape
                     summary_rows.append({
@@ -539,10 +1289,7 @@ def show_design_event_ui():
     # Sidebar toggle to show raw data for debugging purposes
     debug_mode = st.sidebar.checkbox("🛠 Show Design Data Debug", value=False)
 
-    if 'packaged_data' not in st.session_state:
-        with st.spinner("Loading data..."):
-            st.session_state.packaged_data = load_packaged_data()
-    data = st.session_state.packaged_data
+    data = get_packaged_data()
 
     with col1:
         st.subheader("Design Event Selection")
@@ -632,7 +1379,13 @@ def show_design_event_ui():
                 # --- Duration & Ensemble for Monte Carlo model ---
         mc_selected_duration = None
         mc_selected_ensemble = None
-        if model_key == 'design_MC' and selected_aep and selected_location_id:
+        mc_batch_mode = False
+        if model_key == 'design_MC':
+            mc_batch_mode = st.toggle(
+                "Batch mode (all durations & ensembles)", key='mc_batch_mode',
+                help="Show every hydrograph for the AEP and location together, with critical-duration statistics.",
+            )
+        if model_key == 'design_MC' and selected_aep and selected_location_id and not mc_batch_mode:
             mc_durations = get_available_durations_mc(data, selected_aep, selected_location_id)
             if mc_durations:
                 mc_selected_duration = st.selectbox("Select Storm Duration (hrs):", options=mc_durations, key='mc_duration_selector')
@@ -643,13 +1396,15 @@ def show_design_event_ui():
         # --- Climate scenario for MC model ---
         selected_climate_scenario = None
         if model_key == 'design_MC':
-            available_scenarios = get_available_climate_scenarios(data)
+            available_scenarios = get_available_climate_scenarios(
+                data, selected_aep, selected_location_id, mc_selected_duration, mc_selected_ensemble
+            )
             if available_scenarios:
                 selected_climate_scenario = st.selectbox("Select Climate Pathway:", options=available_scenarios, key='climate_selector')
 
         # --- Determine current selection signature for change detection ---
         if model_key == 'design_MC':
-            current_sig = (model_key, selected_aep, selected_location_id, mc_selected_duration, mc_selected_ensemble, selected_climate_scenario)
+            current_sig = (model_key, selected_aep, selected_location_id, mc_selected_duration, mc_selected_ensemble, selected_climate_scenario, mc_batch_mode)
         else:  # design_B15
             current_sig = (model_key, selected_aep, selected_location_id, selected_duration, selected_storm_id, selected_ensemble)
         # Auto-reset results if any selector changed after a run
@@ -658,14 +1413,24 @@ def show_design_event_ui():
 
         # --- Buttons ---
         if st.button("▶️ Run URBS", use_container_width=True, key="run_design", type="primary"):
-            # Simulate model run time
-            with st.spinner("Running URBS model … please wait"):
-                time.sleep(4)
+            st.session_state.design_job_id = get_job_queue().submit('design', {
+                'model': model_key,
+                'aep': selected_aep,
+                'location': selected_location_id,
+                'duration': mc_selected_duration if model_key == 'design_MC' else selected_duration,
+                'ensemble': mc_selected_ensemble if model_key == 'design_MC' else selected_ensemble,
+                'storm_id': selected_storm_id,
+                'climate_scenario': selected_climate_scenario,
+                'batch': mc_batch_mode,
+                'switch': st.session_state.get('urbs_switch', URBS_SWITCHES[0]),
+            })
             st.session_state.show_results = True
+            st.session_state.design_run_complete = False
             st.session_state.last_run_sig = current_sig
             st.rerun()
 
-        st.button("✅ Export to TUFLOW", use_container_width=True, key="export_design", disabled=not st.session_state.get('show_results', False), type="primary")
+        run_complete = st.session_state.get('show_results', False) and st.session_state.get('design_run_complete', False)
+        st.button("✅ Export to TUFLOW", use_container_width=True, key="export_design", disabled=not run_complete, type="primary")
         
         
         #if st.button("🔄 Reset Model", use_container_width=True, key="reset_design"):
@@ -681,7 +1446,11 @@ def show_design_event_ui():
             st.write("Unique AEP values:", data[model_key]['design_events'].get('AEP_Value', data[model_key]['design_events'].get('aep')).unique() if 'design_events' in data[model_key] else None)
 
        
-        if st.session_state.get('show_results', False):
+        if st.session_state.get('show_results', False) and not st.session_state.get('design_run_complete', False):
+            show_job_progress(st.session_state.get('design_job_id'), 'design_run_complete')
+        elif st.session_state.get('show_results', False) and mc_batch_mode:
+            display_design_batch_results(data, selected_aep, selected_location_id, selected_climate_scenario)
+        elif st.session_state.get('show_results', False):
             # Determine which duration/ensemble to pass based on model type
             dur_arg = mc_selected_duration if model_key == 'design_MC' else selected_duration
             ens_arg = mc_selected_ensemble if model_key == 'design_MC' else selected_ensemble
@@ -727,25 +1496,24 @@ def display_design_results(
         st.markdown(f"**Climate Scenario:** `{climate_scenario}`")
 
     # --- Filtering Logic ---
-    def parse_aep_value(val):
-        if isinstance(val, str):
-            numbers = re.findall(r'\d+', val)
-            return int(numbers[-1]) if numbers else None
-        return val
-
+    event_df = None
     try:
         if model_key == 'design_MC':
-            mask = (df['aep'].apply(parse_aep_value) == int(aep)) & (df['location'] == location_id)
-            # duration filter
-            dur_col = next((c for c in df.columns if 'duration' in c.lower()), None)
-            if dur_col and duration is not None:
-                mask &= (df[dur_col] == duration)
-            # ensemble filter
-            ens_col = next((c for c in df.columns if 'ensemble' in c.lower()), None)
-            if ens_col and ensemble is not None:
-                mask &= (df[ens_col] == ensemble)
-            if climate_scenario and climate_scenario != "Select a scenario":
-                mask &= (df['climate_scenario_code'] == climate_scenario)
+            # Single hash probe into the pre-partitioned table (or a filtered
+            # read of the partitioned dataset)
+            event_df = get_mc_hydrograph(data, aep, location_id, duration, ensemble, climate_scenario)
+            if event_df is None:
+                mask = (aep_years_of(df) == float(aep)) & (df['location'] == location_id)
+                # duration filter
+                dur_col = next((c for c in df.columns if 'duration' in c.lower()), None)
+                if dur_col and duration is not None:
+                    mask &= (df[dur_col] == duration)
+                # ensemble filter
+                ens_col = next((c for c in df.columns if 'ensemble' in c.lower()), None)
+                if ens_col and ensemble is not None:
+                    mask &= (df[ens_col] == ensemble)
+                if climate_scenario and climate_scenario != "Select a scenario":
+                    mask &= (df['climate_scenario_code'] == climate_scenario)
         elif model_key == 'design_B15':
             mask = (df['AEP_Years'] == int(aep)) & (df['location'] == location_id)
             # add duration filter if column present and provided
@@ -765,7 +1533,8 @@ def display_design_results(
         st.error(f"Error during filtering: {e}")
         return
 
-    event_df = df[mask]
+    if event_df is None:
+        event_df = df[mask]
 
     if event_df.empty:
         st.warning("No data found for the current selection.")
@@ -789,20 +1558,20 @@ def display_design_results(
     with tab2:
         if model_key == 'design_B15' and 'flow_rate' in event_df.columns:
             flow_df = event_df[['time_hours', 'flow_rate']].rename(columns={'flow_rate': 'Flow (m³/s)', 'time_hours': 'Time (hours)'})
-            st.line_chart(flow_df.set_index('Time (hours)'))
+            show_line_chart(flow_df.set_index('Time (hours)'), key="design_flow_chart")
         elif 'qts' in event_df.columns:
             qts_df = event_df[['time_hours', 'qts']].rename(columns={'qts': 'Flow (m³/s)', 'time_hours': 'Time (hours)'})
-            st.line_chart(qts_df.set_index('Time (hours)'))
+            show_line_chart(qts_df.set_index('Time (hours)'), key="design_flow_chart")
         elif 'flow_rate' in event_df.columns:
             fr_df = event_df[['time_hours', 'flow_rate']].rename(columns={'flow_rate': 'Flow (m³/s)', 'time_hours': 'Time (hours)'})
-            st.line_chart(fr_df.set_index('Time (hours)'))
+            show_line_chart(fr_df.set_index('Time (hours)'), key="design_flow_chart")
         else:
             st.info("No flow data available for this selection.")
 
     with tab1:
         if 'hts' in event_df.columns:
             hts_df = event_df[['time_hours', 'hts']].rename(columns={'hts': 'Water Level (m)', 'time_hours': 'Time (hours)'})
-            st.line_chart(hts_df.set_index('Time (hours)'))
+            show_line_chart(hts_df.set_index('Time (hours)'), key="design_level_chart")
         else:
             st.info("Feature not yet implemented.")
     
@@ -813,11 +1582,125 @@ def display_design_results(
         st.dataframe(event_df)
 
 
+def display_design_batch_results(data: Dict[str, Any], aep: Optional[float], location_id: Optional[str],
+                                 climate_scenario: Optional[str] = None):
+    """Display every MC hydrograph for an AEP and location at once, with
+    ensemble envelopes and critical-duration statistics."""
+    if not all([aep, location_id]):
+        st.warning("Please ensure Model, AEP, and Location are selected.")
+        return
+
+    batch_df = get_mc_hydrograph(data, aep, location_id, None, None, climate_scenario)
+    if batch_df is None:
+        df = data['design_MC']['design_events']
+        mask = (aep_years_of(df) == float(aep)) & (df['location'] == location_id)
+        if climate_scenario and climate_scenario != "Select a scenario":
+            mask &= (df['climate_scenario_code'] == climate_scenario)
+        batch_df = df[mask]
+    if batch_df.empty:
+        st.warning("No data found for the current selection.")
+        return
+
+    flow_col = 'qts' if 'qts' in batch_df.columns else 'flow_rate'
+    peaks, stats = summarise_design_batch(batch_df, flow_col)
+
+    st.subheader(f"Batch results for {st.session_state.selected_model_display}")
+    st.markdown(f"**AEP:** `1 in {int(aep)}` | **Location:** `{st.session_state.selected_location_display}` "
+                f"| **Hydrographs:** `{len(peaks)}`")
+
+    if not stats.empty:
+        st.markdown("### Critical Duration")
+        for key, row in stats[stats['critical']].iterrows():
+            key = key if isinstance(key, tuple) else (key,)
+            label = " / ".join(str(k) for k in key)
+            st.markdown(f"- **{label}**: median peak `{row['median']:,.1f} m³/s` (ensemble `{row['median_ensemble']}`)")
+        st.dataframe(stats.round(1), use_container_width=True)
+
+    tab_env, tab_all, tab_peaks = st.tabs(["Envelope", "All Hydrographs", "Peaks"])
+
+    with tab_env:
+        # One band per climate scenario and duration, matching the statistics
+        # above; mixing scenarios would show their spread, not the ensemble's
+        scenario_cols = [c for c in ('climate_scenario_code',) if c in batch_df.columns]
+        envelope = (
+            batch_df.groupby([*scenario_cols, 'duration', 'time_hours'], observed=True)[flow_col]
+            .agg(['min', 'median', 'max'])
+            .reset_index()
+        )
+        envelope['duration'] = envelope['duration'].astype(str)
+        base = alt.Chart().encode(
+            x=alt.X('time_hours:Q', title='Time (hours)'),
+            color=alt.Color('duration:N', title='Duration'),
+        )
+        band = base.mark_area(opacity=0.25).encode(y=alt.Y('min:Q', title='Flow (m³/s)'), y2='max:Q')
+        chart = alt.layer(band, base.mark_line().encode(y='median:Q'), data=envelope)
+        if scenario_cols:
+            chart = chart.facet(row=alt.Row('climate_scenario_code:N', title='Climate scenario'))
+        st.altair_chart(chart, use_container_width=True)
+        st.caption("Shaded: range of the ensemble members at each time step, per climate scenario "
+                   "and duration; line: median.")
+
+    with tab_all:
+        member_cols = list(peaks.index.names)
+        spaghetti = batch_df.pivot_table(index='time_hours', columns=member_cols, values=flow_col, observed=True)
+        spaghetti.columns = [
+            " · ".join(str(v) for v in (col if isinstance(col, tuple) else (col,)))
+            for col in spaghetti.columns.to_flat_index()
+        ]
+        spaghetti.index.name = 'Time (hours)'
+        show_line_chart(spaghetti, key="design_batch_chart")
+
+    with tab_peaks:
+        st.dataframe(peaks.round(1), use_container_width=True)
+
+
 
 # --- Utility and Page Setup Functions ---
 
+def minmax_downsample(df: pd.DataFrame, max_points: int = CHART_MAX_POINTS) -> pd.DataFrame:
+    """Reduce a chart frame (one row per timestep, one numeric column per
+    series) to roughly *max_points* rows.
+
+    The rows are split into equal buckets and, in each bucket, the rows that
+    hold every series' minimum and maximum are kept. Unlike LTTB this keeps
+    each series' peak exactly and vectorises over all series at once. The
+    first and last rows are always kept.
+    """
+    n_rows, n_cols = df.shape
+    if n_rows <= max_points or n_cols == 0:
+        return df
+    n_buckets = max(max_points // (2 * n_cols), 1)
+    size = -(-n_rows // n_buckets)
+    values = np.full((n_buckets * size, n_cols), np.nan)
+    values[:n_rows] = df.to_numpy(dtype='float64')
+    values = values.reshape(n_buckets, size, n_cols)
+    missing = np.isnan(values)
+    offsets = np.arange(n_buckets)[:, None] * size
+    i_max = np.where(missing, -np.inf, values).argmax(axis=1) + offsets
+    i_min = np.where(missing, np.inf, values).argmin(axis=1) + offsets
+    keep = np.unique(np.concatenate([i_max.ravel(), i_min.ravel(), [0, n_rows - 1]]))
+    return df.iloc[keep[keep < n_rows]]
+
+
+def show_line_chart(df: pd.DataFrame, key: str):
+    """``st.line_chart`` that only ships a peak-preserving subset of long
+    series to the browser, with a toggle to plot every timestep."""
+    if len(df) <= CHART_MAX_POINTS:
+        st.line_chart(df)
+        return
+    full = st.toggle("Full resolution", value=False, key=f"{key}_full_res")
+    chart_df = df if full else minmax_downsample(df)
+    st.line_chart(chart_df)
+    if not full:
+        st.caption(f"Showing {len(chart_df):,} of {len(df):,} timesteps (min/max per interval).")
+
+
 def get_available_durations_mc(data, aep, location):
     """Return sorted list of available storm durations for Monte Carlo model."""
+    mc_index = get_mc_selection_index(data)
+    if mc_index:
+        return lookup_selection_index(mc_index, aep or None, location)
+
     df = data.get('design_MC', {}).get('design_events')
     if df is None:
         return []
@@ -831,7 +1714,7 @@ def get_available_durations_mc(data, aep, location):
     except (ValueError, TypeError):
         return []
 
-    subset = df[(df['aep'] == aep_val) & (df['location'] == location)] if aep_val else df[df['location'] == location]
+    subset = df[(aep_years_of(df) == aep_val) & (df['location'] == location)] if aep_val else df[df['location'] == location]
     if subset.empty:
         return []
 
@@ -839,6 +1722,10 @@ def get_available_durations_mc(data, aep, location):
 
 def get_available_ensembles_mc(data, aep, location, duration=None):
     """Return list of available ensemble members for Monte Carlo model given filters."""
+    mc_index = get_mc_selection_index(data)
+    if mc_index:
+        return lookup_selection_index(mc_index, aep or None, location or None, duration)
+
     df = data.get('design_MC', {}).get('design_events')
     if df is None:
         return []
@@ -847,11 +1734,11 @@ def get_available_ensembles_mc(data, aep, location, duration=None):
     if ensemble_col is None:
         return []
 
-    filtered = df.copy()
+    filtered = df
     if aep:
         try:
             aep_val = float(aep)
-            filtered = filtered[filtered['aep'] == aep_val]
+            filtered = filtered[aep_years_of(filtered) == aep_val]
         except (ValueError, TypeError):
             pass
     if location:
@@ -877,9 +1764,10 @@ def show_home_page(data):
     2.  **Historic Events:** View and compare with past flood events (with or without dams).
     3.  **Design Events:** Examine ensemble design event scenarios at any location for any configuration.
     4.  **Monte Carlo Events:** View any of the previously run Monte Carlo design event scenarios.
-    5.  **Map:** View geospatial data related to the models.
-    6.  **Upload Data:** Upload GIS or rainfall to include in bespoke analysis and compare with other models.
-    7.  **Export URBS to TUFLOW:** Select and send URBS model run to TUFLOW
+    5.  **Frequency Curves:** Flood frequency curves with confidence bands from the Monte Carlo runs.
+    6.  **Map:** View geospatial data related to the models.
+    7.  **Upload Data:** Upload GIS or rainfall to include in bespoke analysis and compare with other models.
+    8.  **Export URBS to TUFLOW:** Select and send URBS model run to TUFLOW
     
     *This application is currently under development and more features are being added.*
     """)
@@ -906,7 +1794,7 @@ def show_home_page(data):
 
 
 def add_geospatial_to_map(m, file_path, layer_name=None):
-    """Add a KMZ, KML, or Shapefile to a folium map."""
+    """Add a GeoJSON file (or already loaded GeoJSON dict) to a folium map."""
     if not layer_name:
         layer_name = Path(file_path).stem
     
@@ -914,93 +1802,105 @@ def add_geospatial_to_map(m, file_path, layer_name=None):
         folium.GeoJson(file_path, name=layer_name).add_to(m)
         return True
     except Exception as e:
-        st.warning(f"Could not load {file_path}: {e}")
+        st.warning(f"Could not load {layer_name}: {e}")
         return False
 
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_catchment_layers(tier: str, signature: str = "") -> Dict[str, Dict[str, Any]]:
+    """Catchment polygons of ``geo/`` simplified for a map zoom tier.
+
+    ``signature`` (``source_signature()``) changes whenever a file in ``geo/``
+    does, so edited catchments are picked up.
+    """
+    return load_simplified_catchments(tier)
+
 import json
 
-@st.cache_data(show_spinner=False)
 def fetch_gauge_layer(
     layer: int,
     bbox: Optional[Tuple[float, float, float, float]] = None,
     ttl_hours: int = 24,
-) -> Dict[str, Any]:
-    """Fetch gauge layer (river=5, rain=4) from the BoM ArcGIS service as GeoJSON.
-
-    A two-tier cache is used:
-    1. Streamlit's in-memory cache (handled by ``@st.cache_data``).
-    2. A persistent disk cache under ``.cache/`` so that data survives app
-       restarts and network outages.
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Gauge layer (river=5, rain=4) from the BoM ArcGIS service as GeoJSON.
 
-    If the remote service times out, a cached copy will be returned (even if it
-    is older than *ttl_hours*) so that the UI remains responsive.
+    Returns at once with the copy cached under ``.cache/`` and its state (see
+    ``bom_gauges.get_gauge_layer``); a missing or expired copy is downloaded
+    in the background, so the page never waits for the BoM service.
     """
-    import json, time, hashlib
+    return get_gauge_layer(layer, bbox, ttl_hours)
 
-    base = (
-        "https://hosting-stg.wsapi-stg.cloud.bom.gov.au/arcgis/rest/services/"
-        f"flood/National_Flood_Gauge_Network/MapServer/{layer}/query"
-    )
-    params = {
-        "where": "1=1",
-        "outFields": "*",
-        "outSR": 4326,
-        "f": "geojson",
-    }
-    if bbox:
-        xmin, ymin, xmax, ymax = bbox
-        params.update(
-            {
-                "geometry": f"{xmin},{ymin},{xmax},{ymax}",
-                "geometryType": "esriGeometryEnvelope",
-                "inSR": 4326,
-                "spatialRel": "esriSpatialRelIntersects",
-            }
-        )
 
-    # --- Persistent disk cache setup ---
-    cache_dir = Path(".cache")
-    cache_dir.mkdir(exist_ok=True)
-    bbox_key = "global" if bbox is None else "_".join(map(str, bbox))
-    cache_file = cache_dir / f"gauge_layer_{layer}_{hashlib.md5(bbox_key.encode()).hexdigest()}.geojson"
+@st.fragment(run_every=2)
+def wait_for_gauge_layers(pending: Tuple[Tuple[int, Optional[Tuple[float, float, float, float]]], ...]):
+    """Rerun the page once every pending gauge layer is cached or has failed.
 
-    # Serve from disk cache if it is still fresh enough
-    if cache_file.exists():
-        age_hours = (time.time() - cache_file.stat().st_mtime) / 3600
-        if age_hours < ttl_hours:
-            try:
-                with cache_file.open("r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception:
-                # Corrupted cache – ignore and fetch afresh
-                pass
+    Waiting for the outcome, not merely for the local refresh to stop, keeps
+    the page from rerunning in a loop while nothing has changed.
+    """
+    if all(layer_settled(layer, bbox) for layer, bbox in pending):
+        st.rerun()
+    else:
+        st.caption("⏳ Downloading gauge locations from the BoM…")
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def load_gauge_rows(
+    layer: int,
+    bbox: Optional[Tuple[float, float, float, float]],
+    version: float,
+) -> List[List[Any]]:
+    """``[lat, lon, name]`` of each gauge of a layer; *version* (download time) keys the cache."""
+    gauges, _ = fetch_gauge_layer(layer, bbox)
+    return [
+        [feat["geometry"]["coordinates"][1], feat["geometry"]["coordinates"][0], feat["properties"].get("name", "")]
+        for feat in gauges.get("features", [])
+        if (feat.get("geometry") or {}).get("type") == "Point"
+    ]
+
+
+def add_gauge_cluster(m, rows: List[List[Any]], color: str):
+    """Add gauge ``[lat, lon, name]`` rows to *m* as one client-side clustered layer.
+
+    Markers are created in the browser from the compact rows
+    (``FastMarkerCluster``) and grouped into clusters until zoomed in, so
+    thousands of gauges cost little more to send and draw than a few.
+    """
+    if not rows:
+        return
+    callback = (
+        "function (row) {"
+        f"  var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {{radius: 4, color: '{color}', "
+        "fillOpacity: 0.8, weight: 1});"
+        "  marker.bindTooltip(row[2]); marker.bindPopup(row[2]);"
+        "  return marker;"
+        "};"
+    )
+    FastMarkerCluster(
+        rows, callback=callback,
+        options={"disableClusteringAtZoom": GAUGE_CLUSTER_MAX_ZOOM, "chunkedLoading": True},
+    ).add_to(m)
 
-    # Fallback to remote request
-    try:
-        resp = requests.get(base, params=params, timeout=60)
-        resp.raise_for_status()
-        data = resp.json()
-        # Save to disk cache for future runs
-        with cache_file.open("w", encoding="utf-8") as f:
-            json.dump(data, f)
-        return data
-    except (requests.exceptions.Timeout, requests.exceptions.RequestException) as e:
-        # If remote fails, use any (even stale) cached copy if available
-        if cache_file.exists():
-            with cache_file.open("r", encoding="utf-8") as f:
-                return json.load(f)
-        # Ultimately give up but keep the app alive
-        print(f"Error fetching gauge layer: {e}")
-        return {}
 
 def show_map_page():
     st.header("Geospatial Map")
-    st.info("This page displays river gauge locations (rain gauges hidden).")
-    
-    # SE QLD bbox including Toowoomba (lon/lat)
-    brisbane_bbox = (151.5, -28.5, 153.4, -26.2)
-
-    # Create map centred on Ipswich (approx) and still show wider SE QLD
+    st.info("This page displays BoM river and rain gauge locations.")
+
+    ctrl1, ctrl2 = st.columns([1, 2])
+    with ctrl1:
+        extent = st.radio("Gauge extent", list(MAP_EXTENTS), horizontal=True, key="map_extent")
+    with ctrl2:
+        shown_layers = [
+            (layer, label, color) for layer, label, color in GAUGE_LAYERS
+            if st.checkbox(f"Show {label.lower()}", value=(layer == 5), key=f"map_layer_{layer}")
+        ]
+    gauge_bbox = MAP_EXTENTS[extent]
+
+    # Base map centred on Ipswich (approx) and still showing wider SE QLD. It
+    # holds only the tiles and is cheap to build; st_folium attaches the layers
+    # below to it, so it is rebuilt every run rather than shared. Its HTML does
+    # not change between runs, so the browser keeps the map (and its view) and
+    # only swaps the layers.
     ipswich_center = [-27.62, 152.76]
     m = folium.Map(location=ipswich_center, zoom_start=9)
     # Optionally show full bbox for context – comment out if not desired
@@ -1020,48 +1920,57 @@ def show_map_page():
         control=True
     ).add_to(m)
 
+    # Layers are passed to st_folium, which changes them (ids, parent), so they
+    # are built fresh every run from the cached, simplified data
+    layers = []
 
-    
-    # --- Load all GeoJSON files from the geo folder ---
+    # --- Catchments from the geo folder, simplified for the map's last zoom level ---
     geo_dir = "geo"
+    zoom = (st.session_state.get('gauge_map') or {}).get('zoom') or 9
     if os.path.exists(geo_dir) and os.path.isdir(geo_dir):
-        # Find all .geojson files in the geo directory
-        geojson_files = [f for f in os.listdir(geo_dir) if f.lower().endswith('.geojson')]
+        catchments = load_catchment_layers(zoom_tier(zoom), source_signature(Path(geo_dir)))
         
-        if not geojson_files:
+        if not catchments:
             st.info("No GeoJSON files found in the 'geo' folder.")
-        else:
-            for geojson_file in geojson_files:
-                file_path = os.path.join(geo_dir, geojson_file)
-                layer_name = os.path.splitext(geojson_file)[0]  # Use filename without extension as layer name
-                if not add_geospatial_to_map(m, file_path, layer_name):
-                    st.warning(f"Could not load {geojson_file}")
+        for layer_name, geojson in catchments.items():
+            group = folium.FeatureGroup(name=layer_name)
+            if add_geospatial_to_map(group, geojson, layer_name):
+                layers.append(group)
     
-    folium.LayerControl().add_to(m)
-
-    # Fetch river and rain gauges within Brisbane bbox
-    river_geo = fetch_gauge_layer(5, brisbane_bbox)
-    # rain gauges disabled
+    # Fetch the selected gauge layers within the chosen extent (clustered on the map)
+    pending = []
+    counts = []
+    for layer, label, color in shown_layers:
+        gauges, info = fetch_gauge_layer(layer, gauge_bbox)
+        counts.append(f"{label}: {len(gauges.get('features', []))}")
+        rows = load_gauge_rows(layer, gauge_bbox, info.get('stored', 0.0))
+        if rows:
+            group = folium.FeatureGroup(name=label)
+            add_gauge_cluster(group, rows, color)
+            layers.append(group)
+        if info['state'] == 'pending':
+            pending.append((layer, gauge_bbox))
+        elif info['state'] == 'stale':
+            st.caption(f"{label} are {info['age_hours']:.0f} h old; refreshing in the background.")
+        elif info['state'] == 'error':
+            st.warning(f"Could not fetch {label.lower()}: {info['error']}")
 
     # Debug output
-    river_count = len(river_geo.get("features", [])) if isinstance(river_geo, dict) else 0
-    st.info(f"River gauges returned: {river_count}")
-
-    # Using simple CircleMarker for ~<500 points for clarity
-    for feat in river_geo.get("features", []):
-        lon, lat = feat["geometry"]["coordinates"]
-        folium.CircleMarker(
-            location=[lat, lon],
-            radius=3,
-            color="blue",
-            fill=True,
-            fill_opacity=0.8,
-            popup=feat["properties"].get("name", ""),
-            tooltip=feat["properties"].get("name", "")
-        ).add_to(m)
-
-    # Display the map (explicit centre so Streamlit doesn’t override)
-    st_folium(m, use_container_width=True, height=600, center=[-27.62, 152.76], zoom=9)
+    st.info(" | ".join(counts) if counts else "No gauge layers selected.")
+    if pending:
+        wait_for_gauge_layers(tuple(pending))
+
+    # Only a zoom change is reported back (to pick the catchment detail), so
+    # panning the map does not rerun the page
+    st_folium(
+        m,
+        feature_group_to_add=layers,
+        layer_control=folium.LayerControl(),
+        returned_objects=["zoom"],
+        use_container_width=True,
+        height=600,
+        key="gauge_map",
+    )
 
 
 def show_upload_page():
@@ -1074,6 +1983,71 @@ def show_upload_page():
         st.success("File uploaded successfully!")
         # Add file processing logic here
 
+def show_frequency_page():
+    """Monte Carlo flood frequency curves for any location."""
+    st.header("Flood Frequency Curves")
+    data = get_packaged_data()
+    peaks = load_mc_peaks(get_data_version('design_MC'))
+    if peaks.empty or 'aep_years' not in peaks.columns:
+        st.warning("No Monte Carlo design data available.")
+        return
+
+    bands = {"10% – 90%": (0.1, 0.9), "5% – 95%": (0.05, 0.95), "25% – 75%": (0.25, 0.75), "Min – max": (0.0, 1.0)}
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        locations = [loc for loc in get_available_locations(data, 'design_MC') if loc[1]]
+        location_display, location_id = st.selectbox(
+            "Select Location:", options=locations, format_func=lambda x: x[0], key='freq_location_selector'
+        )
+        scenarios = sorted(peaks['climate_scenario_code'].dropna().unique()) if 'climate_scenario_code' in peaks else []
+        selected_scenarios = st.multiselect("Climate Pathways:", scenarios, default=scenarios, key='freq_scenarios')
+        band_label = st.radio("Confidence band", list(bands), key='freq_band')
+        metrics = {'Peak flow (m³/s)': 'peak_flow', 'Peak level (m)': 'peak_level'}
+        metrics = {label: col for label, col in metrics.items() if col in peaks.columns}
+        metric_label = st.radio("Statistic", list(metrics), key='freq_metric') if len(metrics) > 1 else next(iter(metrics))
+
+    curves = build_frequency_curves(peaks, *bands[band_label])
+    curve = curves[(curves['metric'] == metrics[metric_label]) & (curves['location'] == location_id)]
+    if 'climate_scenario_code' in curve.columns:
+        curve = curve[curve['climate_scenario_code'].isin(selected_scenarios)]
+        curve = curve.assign(climate_scenario_code=curve['climate_scenario_code'].astype(str))
+
+    with col2:
+        st.subheader(f"{location_display} – {metric_label}")
+        if curve.empty:
+            st.info("No realisations for this selection.")
+            return
+        base = alt.Chart(curve).encode(
+            x=alt.X('aep_years:Q', scale=alt.Scale(type='log'), title='AEP (1 in Y years)'),
+            color=alt.Color('climate_scenario_code:N', title='Climate Pathway'),
+        )
+        band = base.mark_area(opacity=0.2).encode(y=alt.Y('lower:Q', title=metric_label), y2='upper:Q')
+        line = base.mark_line(point=True).encode(
+            y='median:Q',
+            tooltip=['climate_scenario_code', 'aep_years', 'count', 'lower', 'median', 'upper'],
+        )
+        st.altair_chart(band + line, use_container_width=True)
+        st.caption(f"Line: median of the realisations (durations × ensembles) at each AEP; "
+                   f"shaded: {band_label} range.")
+        st.dataframe(
+            curve.drop(columns=['metric', 'location']).set_index(['climate_scenario_code', 'aep_years']).round(2),
+            use_container_width=True,
+        )
+        st.download_button(
+            "Download all curves (CSV)",
+            curves.to_csv(index=False).encode(),
+            file_name="mc_frequency_curves.csv",
+            mime="text/csv",
+            key='freq_download',
+        )
+
+
+@st.cache_data(show_spinner="Parsing URBS log...", max_entries=8)
+def load_urbs_log(path: str, mtime_ns: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Streamed ``(runs, files)`` tables of an URBS log; *mtime_ns* only keys the cache."""
+    return parse_urbs_log(Path(path))
+
+
 def show_model_performance_page():
     st.header("Model Performance")
     st.info("This page will display model performance metrics when available.")
@@ -1084,9 +2058,14 @@ def show_model_performance_page():
     
     if os.path.exists(log_file_path):
         try:
-            with open(log_file_path, 'r') as f:
-                log_content = f.read()
-            st.markdown(log_content)
+            runs, files = load_urbs_log(log_file_path, os.stat(log_file_path).st_mtime_ns)
+            st.write(f"{len(runs)} runs, {len(files)} input files accessed")
+            st.dataframe(runs, hide_index=True, use_container_width=True)
+            with st.expander("Files accessed"):
+                st.dataframe(files, hide_index=True, use_container_width=True)
+            with st.expander(f"Raw log (last {LOG_TAIL_LINES} lines)"):
+                with open(log_file_path, 'r', errors='replace') as f:
+                    st.code("".join(deque(f, maxlen=LOG_TAIL_LINES)), language=None)
         except Exception as e:
             st.error(f"An error occurred while reading the log file: {e}")
     else:
@@ -1118,7 +2097,8 @@ def show_settings_page():
     st.write("Update URBS switches here.") 
     genre = st.radio(
     "Enable URBS switches",
-    ["URBS TFLW", "URBS ATKN", "URBS MATCH", "URBS BASEFLOW"],
+    URBS_SWITCHES,
+    index=URBS_SWITCHES.index(st.session_state.get('urbs_switch', URBS_SWITCHES[0])),
     captions=[
         "Output TUFLOW csv.",
         "Use RAFTS settings in URBS.",
@@ -1126,8 +2106,25 @@ def show_settings_page():
         "Enable Baseflow model."]
     
 )
+    # Kept outside the widget state so runs started on other pages see it
+    st.session_state.urbs_switch = genre
     st.info("Application settings and user preferences will be configured here.")
 
+    with st.expander("🛠 Administration"):
+        st.write(
+            "Cached data is shared by all users and refreshes automatically when the "
+            "files in `data_parquet/` change. Clear it manually only if needed."
+        )
+        report = get_memory_report()
+        if report:
+            st.write("Memory saved by dtype compaction of loaded tables:")
+            st.dataframe(pd.DataFrame(list(report.values())), hide_index=True)
+        st.write("Gauge layer cache (`.cache/gauges/`, this app process):")
+        st.dataframe(pd.DataFrame([gauge_cache.stats()]), hide_index=True)
+        if st.button("Clear cached data", key="admin_clear_cache"):
+            clear_data_caches()
+            st.success("Data caches cleared – data will be reloaded on next use.")
+
 ## LAM - added
 import json
 feedback_file = "feedback.json"
@@ -1189,9 +2186,6 @@ def add_logo_to_page():
 
 # --- Main Application Router ---
 def main():
-    # Clear any cached data
-    st.cache_data.clear()
-    
     # --- Page configuration with optional favicon ---
     favicon_path = Path("data/WRM_DROPLET.png")
     page_icon_arg = str(favicon_path) if favicon_path.is_file() else None
@@ -1222,7 +2216,7 @@ def main():
     st.sidebar.title("Navigation")
     page = st.sidebar.radio(
         "Go to",
-        ["Home", "Historic Events", "Design Events", "Map", "Model Performance", "QuickStart Guide", "Settings", "Feedback"]
+        ["Home", "Historic Events", "Design Events", "Frequency Curves", "Map", "Model Performance", "QuickStart Guide", "Settings", "Feedback"]
     )
     
     # Page routing
@@ -1231,17 +2225,12 @@ def main():
     elif page == "Historic Events":
         # Create columns for historic events
         col1, col2 = st.columns([1, 2])
-        if 'historical' in st.session_state.get('packaged_data', {}):
-            show_historic_event_ui(st.session_state.packaged_data['historical'], col1, col2)
-        else:
-            #st.warning("Historical data loading... Please wait.")
-            #if 'packaged_data' not in st.session_state:
-            with st.spinner("Loading data..."):
-                st.session_state.packaged_data = load_packaged_data()
-                show_historic_event_ui(st.session_state.packaged_data['historical'], col1, col2)
+        show_historic_event_ui(get_packaged_data()['historical'], col1, col2)
 
     elif page == "Design Events":
         show_design_event_ui()
+    elif page == "Frequency Curves":
+        show_frequency_page()
     elif page == "Map":
         show_map_page()
     #elif page == "Upload Data":
@@ -0,0 +1,420 @@
+"""Persistent queue of URBS runs executed as subprocesses on a bounded pool.
+
+Jobs are stored in a SQLite database (``.cache/jobs.sqlite``), so they survive
+restarts and can be submitted from any app process. Each ``JobQueue`` started
+with ``start()`` runs up to ``workers`` dispatcher threads; a dispatcher claims
+the oldest queued job, runs the URBS command in the job's own working
+directory (``.cache/jobs/<id>/``) and streams its console output into
+``urbsout.log`` there, updating the job's progress from the stage lines URBS
+prints. The web worker only ever reads job rows, so a run never blocks it.
+
+The command is taken from ``URBS_COMMAND`` (e.g. ``"C:\\URBS\\urbsu.exe"``);
+without it the local ``urbs_stub.py`` is used. The job specification is
+written to ``job.json`` in the working directory and its path is passed as the
+last argument.
+
+Finished runs are moved into a content-addressed ``ResultCache``
+(``.cache/results/<key>/``), keyed on the job kind and specification plus a
+hash of the model input files (``*.vec``, ``*.dat``, ``*.ini`` under
+``URBS_MODEL_DIR``). Submitting a run that is already cached returns a finished
+job at once, and one that is already queued or running returns that job. The
+cache is limited to ``URBS_RESULT_CACHE_MB`` and evicts the least recently used
+results (never the one just stored); a finished job whose result was evicted
+is queued again when it is next read.
+"""
+import hashlib
+import json
+import os
+import queue
+import shlex
+import shutil
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+JOB_DB = Path(".cache") / "jobs.sqlite"
+JOB_DIR = Path(".cache") / "jobs"
+DEFAULT_WORKERS = int(os.environ.get("URBS_WORKERS", "2"))
+RESULT_CACHE_DIR = Path(".cache") / "results"
+RESULT_CACHE_MAX_BYTES = int(float(os.environ.get("URBS_RESULT_CACHE_MB", "2048")) * 2**20)
+MODEL_DIR = Path(os.environ.get("URBS_MODEL_DIR", "model"))
+MODEL_INPUT_PATTERNS = ("*.vec", "*.dat", "*.ini")
+STUB_COMMAND = [sys.executable, str(Path(__file__).with_name("urbs_stub.py"))]
+# A running job whose heartbeat is older than this is assumed orphaned
+# (its app process died) and is queued again
+STALE_AFTER_SECONDS = 60
+HEARTBEAT_SECONDS = 2
+# Working directories of failed or cancelled runs are kept this long for
+# inspection (finished runs are moved into the result cache)
+KEEP_FAILED_DAYS = 7
+POLL_SECONDS = 0.5
+# URBS console line prefix -> fraction of the run completed
+PROGRESS_STAGES = (
+    ("Reading initialisation file", 0.05),
+    ("Reading Catchment File", 0.15),
+    ("Reading Rainfall File", 0.35),
+    ("Doing Hydrologic Model", 0.75),
+    ("Writing Results", 0.9),
+    ("Finished", 1.0),
+)
+FINAL_STATUSES = ("done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    workdir TEXT,
+    returncode INTEGER,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    heartbeat REAL,
+    cache_key TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitted);
+"""
+# Columns added after the first release, created on databases that lack them
+_ADDED_COLUMNS = {"cache_key": "TEXT"}
+
+
+def urbs_command() -> List[str]:
+    """The URBS command line, from ``URBS_COMMAND`` or the local stub."""
+    command = os.environ.get("URBS_COMMAND")
+    return shlex.split(command, posix=os.name != "nt") if command else list(STUB_COMMAND)
+
+
+@lru_cache(maxsize=1024)
+def _file_sha1(path: str, mtime_ns: int, size: int) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_input_hash(model_dir: Path = MODEL_DIR) -> str:
+    """Hash of the contents of the URBS model input files under *model_dir*.
+
+    File digests are memoised on (path, mtime, size), so unchanged inputs are
+    not read again.
+    """
+    digest = hashlib.sha1()
+    files = sorted({p for pattern in MODEL_INPUT_PATTERNS for p in Path(model_dir).rglob(pattern)})
+    for path in files:
+        stat = path.stat()
+        digest.update(path.relative_to(model_dir).as_posix().encode())
+        digest.update(_file_sha1(str(path), stat.st_mtime_ns, stat.st_size).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Finished URBS working directories stored by content key, with LRU eviction.
+
+    A result's directory mtime is its last use; once the cache is larger than
+    *max_bytes* the least recently used results are deleted, except the one
+    just stored (even if it alone is larger).
+    """
+
+    def __init__(self, root: Path = RESULT_CACHE_DIR, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kind: str, spec: Dict[str, Any], inputs_hash: str) -> str:
+        payload = json.dumps([kind, spec, inputs_hash], default=str, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Path]:
+        """The stored result directory for *key*, marked as just used, or None."""
+        path = self.root / key
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, workdir: Path) -> Path:
+        """Move a finished working directory into the cache and evict old results.
+
+        The directory is moved, not copied, so a result is stored once; the
+        returned path is its new location.
+        """
+        path = self.root / key
+        tmp_path = self.root / f".{key}.{uuid.uuid4().hex}.tmp"
+        self.root.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(workdir), str(tmp_path))
+        try:
+            tmp_path.rename(path)
+        except OSError:
+            # Stored concurrently by another worker with identical inputs
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        os.utime(path)
+        self.evict(keep=key)
+        return path
+
+    @staticmethod
+    def _size(path: Path) -> int:
+        return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Delete least recently used results (but not *keep*) until the cache fits in ``max_bytes``."""
+        with self._lock:
+            entries = [(p.stat().st_mtime, p) for p in self.root.iterdir() if p.is_dir() and not p.name.startswith(".")]
+            sizes = {p: self._size(p) for _, p in entries}
+            total = sum(sizes.values())
+            for _, path in sorted(entries, key=lambda entry: entry[0]):
+                if total <= self.max_bytes:
+                    break
+                if keep and path.name == keep:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                total -= sizes[path]
+
+
+def _pump(stream, lines: "queue.Queue[Optional[str]]") -> None:
+    """Copy *stream* line by line into *lines*, then put ``None``."""
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+
+class JobQueue:
+    """Submit, track and run URBS jobs; see the module docstring."""
+
+    def __init__(self, db_path: Path = JOB_DB, job_dir: Path = JOB_DIR, workers: int = DEFAULT_WORKERS,
+                 command: Optional[List[str]] = None, cache: Optional[ResultCache] = None):
+        self.db_path = Path(db_path)
+        self.job_dir = Path(job_dir)
+        self.workers = max(int(workers), 1)
+        self.command = command or urbs_command()
+        self.cache = cache or ResultCache()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+            existing = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            for name, kind in _ADDED_COLUMNS.items():
+                if name not in existing:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as db:
+            db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _heartbeat(self, job_id: str, progress: float, message: str, now: float) -> Optional[str]:
+        """Record a running job's progress and return its status, on one connection."""
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET progress = ?, message = ?, heartbeat = ? WHERE id = ?",
+                       (progress, message, now, job_id))
+            row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    @staticmethod
+    def _as_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["spec"] = json.loads(job["spec"])
+        return job
+
+    # --- Client API ---------------------------------------------------------
+    def submit(self, kind: str, spec: Dict[str, Any]) -> str:
+        """Queue a run and return its job id.
+
+        If the same run (same spec and model inputs) is already cached the
+        returned job is finished already; if it is queued or running, that
+        job's id is returned instead of starting another run.
+        """
+        cache_key = self.cache.key(kind, spec, model_input_hash())
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        spec_json = json.dumps(spec, default=str, sort_keys=True)
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            pending = db.execute(
+                "SELECT id FROM jobs WHERE cache_key = ? AND status IN ('queued', 'running') "
+                "ORDER BY submitted LIMIT 1", (cache_key,),
+            ).fetchone()
+            cached = None if pending else self.cache.get(cache_key)
+            if pending:
+                job_id = pending["id"]
+            elif cached:
+                db.execute(
+                    "INSERT INTO jobs (id, kind, spec, status, progress, message, workdir, returncode, "
+                    "submitted, started, finished, cache_key) "
+                    "VALUES (?, ?, ?, 'done', 1, 'Stored result', ?, 0, ?, ?, ?, ?)",
+                    (job_id, kind, spec_json, str(cached), now, now, now, cache_key),
+                )
+            else:
+                db.execute(
+                    "INSERT INTO jobs (id, kind, spec, status, submitted, cache_key) VALUES (?, ?, ?, 'queued', ?, ?)",
+                    (job_id, kind, spec_json, now, cache_key),
+                )
+            db.execute("COMMIT")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job's row. A finished job whose stored result has since been
+        evicted from the result cache is queued again (and returned queued)."""
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None and row["status"] == "done" and row["workdir"] and not Path(row["workdir"]).exists():
+                db.execute(
+                    "UPDATE jobs SET status = 'queued', progress = 0, message = 'Result evicted; requeued', "
+                    "workdir = NULL, returncode = NULL, started = NULL, finished = NULL "
+                    "WHERE id = ? AND status = 'done'", (job_id,),
+                )
+                row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._as_dict(row) if row else None
+
+    def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """The most recently submitted jobs, newest first."""
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM jobs ORDER BY submitted DESC LIMIT ?", (limit,)).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+    def position(self, job_id: str) -> int:
+        """Number of queued jobs ahead of *job_id*."""
+        with self._connect() as db:
+            (ahead,) = db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND submitted < "
+                "(SELECT submitted FROM jobs WHERE id = ?)", (job_id,),
+            ).fetchone()
+        return ahead
+
+    def cancel(self, job_id: str) -> None:
+        """Cancel a queued job, or ask the dispatcher to stop a running one."""
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                       (time.time(), job_id))
+            db.execute("UPDATE jobs SET status = 'cancelling' WHERE id = ? AND status = 'running'", (job_id,))
+
+    # --- Dispatchers --------------------------------------------------------
+    def start(self) -> "JobQueue":
+        """Start the dispatcher threads (idempotent)."""
+        if not self._threads:
+            self._requeue_stale()
+            self._prune_job_dirs()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._dispatch, name=f"urbs-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _requeue_stale(self) -> None:
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'queued', progress = 0, message = 'Requeued' "
+                "WHERE status IN ('running', 'cancelling') AND heartbeat < ?",
+                (time.time() - STALE_AFTER_SECONDS,),
+            )
+
+    def _prune_job_dirs(self) -> None:
+        """Delete the working directories of failed or cancelled runs older than ``KEEP_FAILED_DAYS``."""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT workdir FROM jobs WHERE status IN ('failed', 'cancelled') AND finished < ? "
+                "AND workdir IS NOT NULL",
+                (time.time() - KEEP_FAILED_DAYS * 86400,),
+            ).fetchall()
+        for row in rows:
+            workdir = Path(row["workdir"])
+            if workdir.parent == self.job_dir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to 'running'."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY submitted LIMIT 1").fetchone()
+            if row is not None:
+                now = time.time()
+                db.execute("UPDATE jobs SET status = 'running', started = ?, heartbeat = ? WHERE id = ?",
+                           (now, now, row["id"]))
+            db.execute("COMMIT")
+        return self._as_dict(row) if row else None
+
+    def _dispatch(self) -> None:
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                self._stop.wait(POLL_SECONDS)
+                continue
+            try:
+                self._run(job)
+            except Exception as e:
+                self._update(job["id"], status="failed", message=str(e), finished=time.time())
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        workdir = self.job_dir / job["id"]
+        workdir.mkdir(parents=True, exist_ok=True)
+        spec_file = workdir / "job.json"
+        spec_file.write_text(json.dumps({"id": job["id"], "kind": job["kind"], **job["spec"]}, indent=2))
+        self._update(job["id"], workdir=str(workdir), message="Starting URBS")
+
+        progress, cancelled = 0.0, False
+        with open(workdir / "urbsout.log", "w") as log:
+            proc = subprocess.Popen(
+                [*self.command, str(spec_file.resolve())],
+                cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace",
+            )
+            # URBS can be silent for minutes while routing, so read its output
+            # on a helper thread and keep heartbeating / checking for cancellation
+            lines: "queue.Queue[Optional[str]]" = queue.Queue()
+            threading.Thread(target=_pump, args=(proc.stdout, lines), daemon=True).start()
+            # Progress is kept in memory and written (with the heartbeat and
+            # the cancellation check) at most once per HEARTBEAT_SECONDS, not
+            # once per console line
+            message = "Starting URBS"
+            next_beat = 0.0
+            while True:
+                try:
+                    line = lines.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    line = ""
+                if line is None:
+                    break
+                if line:
+                    log.write(line)
+                    line = line.strip()
+                    progress = max([progress] + [p for prefix, p in PROGRESS_STAGES if line.startswith(prefix)])
+                    message = line[:200] or message
+                now = time.time()
+                if now < next_beat:
+                    continue
+                next_beat = now + HEARTBEAT_SECONDS
+                log.flush()
+                if self._heartbeat(job["id"], progress, message, now) == "cancelling":
+                    proc.terminate()
+                    cancelled = True
+                    break
+            returncode = proc.wait()
+
+        if cancelled:
+            status = "cancelled"
+        else:
+            status = "done" if returncode == 0 else "failed"
+        if status == "done" and job.get("cache_key"):
+            workdir = self.cache.put(job["cache_key"], workdir)
+        self._update(job["id"], status=status, workdir=str(workdir), returncode=returncode, finished=time.time(), message=message,
+                     progress=1.0 if status == "done" else progress)
@@ -0,0 +1,186 @@
+"""Streaming parser for URBS console logs (``urbsout.log``) and result files.
+
+An URBS log is a sequence of run blocks, each starting with ``Use by ...: URBS
+Run dated <date>``, and lists the parameters, catchment statistics and the
+files the run read. ``iter_urbs_runs`` walks the log one line at a time and
+yields one record per run, so batch logs with thousands of runs are never held
+in memory; ``parse_urbs_log`` collects the records into two tables:
+
+* runs – one row per run: run date, ini/catchment/rainfall files, model type,
+  ``alpha``, ``m``, ``beta``, ``n``, ``area``, ``dav``, ``fav``, ``sf``,
+  ``cv``, ``g``, ``sc_pct``, the urban/forest/impervious fractions, number of
+  linked pluviographs and the finish time (empty if the run did not finish).
+* files – one row per ``Accessing file`` line: run number, section of the log
+  (``catchment`` or ``rainfall``) and path.
+
+``runs_to_params`` and ``read_urbs_hydrographs`` convert a run and an URBS
+result CSV to the layout of the ``*_params.parquet`` / ``*_timeseries.parquet``
+files read by the app.
+
+Usage::
+
+    python urbs_log_parser.py data/urbsout.log [--out data_parquet/urbs_runs]
+"""
+import argparse
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+RUN_START = "URBS Run dated"
+_NUMBER = r"\s*([-+]?\d*\.?\d+)"
+# line prefix -> {field: regex}; all fields of a line are searched independently
+LINE_FIELDS = {
+    "Parameters:": {
+        "alpha": rf"alpha\s*={_NUMBER}",
+        "m": rf"\bm\s*={_NUMBER}",
+        "beta": rf"beta\s*={_NUMBER}",
+        "n": rf"\bn\s*={_NUMBER}",
+    },
+    "Area=": {
+        "area": rf"Area=\s*{_NUMBER}",
+        "dav": rf"dav=\s*{_NUMBER}",
+        "fav": rf"fav=\s*{_NUMBER}",
+        "sf": rf"sf=\s*{_NUMBER}",
+        "cv": rf"Cv=\s*{_NUMBER}",
+        "g": rf"\bg=\s*{_NUMBER}",
+        "sc_pct": rf"Sc=\s*{_NUMBER}",
+    },
+    "Urban fraction": {
+        "urban_fraction": rf"Urban fraction\s*=\s*{_NUMBER}",
+        "forest_fraction": rf"Forest fraction\s*=\s*{_NUMBER}",
+        "impervious_fraction": rf"Impervious fraction\s*=\s*{_NUMBER}",
+    },
+}
+LINE_PATTERNS = {
+    prefix: {field: re.compile(pattern) for field, pattern in fields.items()}
+    for prefix, fields in LINE_FIELDS.items()
+}
+RUN_COLUMNS = [
+    "run", "run_dated", "ini_file", "catchment_file", "model", *(
+        field for fields in LINE_FIELDS.values() for field in fields
+    ), "pluviographs", "rainfall_file", "finished",
+]
+
+
+def _new_run(number: int, run_dated: Optional[str] = None) -> Dict:
+    run = dict.fromkeys(RUN_COLUMNS)
+    run.update(run=number, run_dated=run_dated, files=[])
+    return run
+
+
+def iter_urbs_runs(lines: Iterable[str]) -> Iterator[Dict]:
+    """Yield one dict per URBS run found in *lines* (any iterable of str,
+    e.g. an open file). Each dict has the ``RUN_COLUMNS`` keys plus ``files``,
+    a list of ``(section, path)`` tuples."""
+    run: Optional[Dict] = None
+    number = 0
+    section = "catchment"
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            continue
+        if RUN_START in line:
+            if run is not None:
+                yield run
+            number += 1
+            run = _new_run(number, line.split(RUN_START, 1)[1].strip())
+            section = "catchment"
+            continue
+        if run is None:
+            # Logs from a single run have no "Run dated" banner
+            number += 1
+            run = _new_run(number)
+
+        if line.startswith("Accessing file"):
+            run["files"].append((section, line[len("Accessing file"):].strip()))
+        elif line.startswith("Reading initialisation file"):
+            run["ini_file"] = line[len("Reading initialisation file"):].strip()
+        elif line.startswith("Reading Catchment File"):
+            run["catchment_file"] = line[len("Reading Catchment File"):].strip(" .")
+        elif line.startswith("Reading Rainfall File"):
+            run["rainfall_file"] = line[len("Reading Rainfall File"):].strip(" .")
+            section = "rainfall"
+        elif line.startswith("URBS Model:"):
+            run["model"] = line.split(":", 1)[1].strip()
+        elif line.startswith("Linked") and "pluviograph" in line:
+            run["pluviographs"] = int(re.search(r"\d+", line).group())
+        elif line.startswith("Finished"):
+            run["finished"] = line[len("Finished"):].strip()
+        else:
+            for prefix, patterns in LINE_PATTERNS.items():
+                if line.startswith(prefix):
+                    for field, pattern in patterns.items():
+                        match = pattern.search(line)
+                        if match:
+                            run[field] = float(match.group(1))
+                    break
+    if run is not None:
+        yield run
+
+
+def parse_urbs_log(path: Path) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Stream *path* and return the ``(runs, files)`` tables."""
+    runs: List[Dict] = []
+    files: List[Tuple[int, str, str]] = []
+    with open(path, "r", errors="replace") as f:
+        for run in iter_urbs_runs(f):
+            files.extend((run["run"], section, file) for section, file in run.pop("files"))
+            runs.append(run)
+    runs_df = pd.DataFrame(runs, columns=RUN_COLUMNS)
+    files_df = pd.DataFrame(files, columns=["run", "section", "path"])
+    numeric = [field for fields in LINE_FIELDS.values() for field in fields]
+    runs_df[numeric] = runs_df[numeric].astype("float64")
+    runs_df["pluviographs"] = runs_df["pluviographs"].astype("Int64")
+    for col in ("model", "ini_file", "catchment_file", "rainfall_file"):
+        runs_df[col] = runs_df[col].astype("category")
+    files_df["section"] = files_df["section"].astype("category")
+    return runs_df, files_df
+
+
+def runs_to_params(runs: pd.DataFrame) -> pd.DataFrame:
+    """Routing parameters of each run in the ``*_params.parquet`` layout
+    (index ``Model``). Losses are not in the log and are left empty."""
+    params = pd.DataFrame({
+        "Model": runs["ini_file"].astype(str).str.replace(r"\.ini$", "", regex=True),
+        "alpha": runs["alpha"],
+        "beta": runs["beta"],
+        "Initial Loss (mm)": float("nan"),
+        "Continuing Loss (mm/hr)": float("nan"),
+        "m": runs["m"],
+        "n": runs["n"],
+    })
+    return params.set_index("Model")
+
+
+def read_urbs_hydrographs(path: Path, chunksize: int = 50_000) -> pd.DataFrame:
+    """Read an URBS result CSV (time column followed by ``<LOCATION> (C|R)``
+    columns) in chunks into the ``*_timeseries.parquet`` layout."""
+    chunks = []
+    for chunk in pd.read_csv(path, chunksize=chunksize, skipinitialspace=True):
+        chunk = chunk.rename(columns={chunk.columns[0]: "time_hours"})
+        chunks.append(chunk.apply(pd.to_numeric, errors="coerce").astype("float32"))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=["time_hours"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("log", type=Path, help="URBS console log, e.g. data/urbsout.log")
+    parser.add_argument("--out", type=Path, default=None,
+                        help="write <out>_runs.parquet and <out>_files.parquet instead of printing")
+    args = parser.parse_args(argv)
+
+    runs, files = parse_urbs_log(args.log)
+    if args.out is None:
+        print(runs.to_string(index=False))
+        print(f"\n{len(runs)} runs, {len(files)} files accessed")
+        return
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    runs.to_parquet(args.out.with_name(args.out.name + "_runs.parquet"), index=False)
+    files.to_parquet(args.out.with_name(args.out.name + "_files.parquet"), index=False)
+    print(f"Wrote {len(runs)} runs and {len(files)} file references to {args.out}_*.parquet")
+
+
+if __name__ == "__main__":
+    main()
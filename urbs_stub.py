@@ -0,0 +1,83 @@
+"""Stand-in for the URBS executable, for testing the job queue without a model.
+
+Prints the same console output as a real URBS run (see ``data/urbsout.log``),
+pausing between stages, writes a synthetic result file ``lower17.csv`` (time
+column followed by ``<LOCATION> (C)`` columns, shaped by the ``aep``,
+``duration`` and ``ensemble`` of the job specification) and exits with status
+0. The job queue and ``run_design_mc.py`` run it when ``URBS_COMMAND`` is not
+set.
+
+Usage::
+
+    python urbs_stub.py [job.json] [--delay 0.5] [--fail]
+
+``--delay`` (or ``URBS_STUB_DELAY``) is the pause in seconds after each stage;
+``--fail`` exits with status 1 half-way through.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+STAGES = [
+    "Reading initialisation file lower17.ini",
+    "Reading Catchment File model\\lower17.vec ...\n"
+    "URBS Model: SPLIT\n"
+    "Parameters: alpha =0.3000, m =  0.80, beta =  4.00, n =  1.00\n"
+    "Area= 13508.1, dav= 31.44, fav= 25.74, sf= 0.29, Cv= 0.423 g= 0.140 Sc=  0.00%\n"
+    "Urban fraction = 0.033, Forest fraction = 0.000 Impervious fraction = 0.025\n"
+    "Linked 104 pluviographs\n"
+    "File ok!",
+    "Reading Rainfall File model\\lower17.rdf ...\nFile ok!",
+    "Doing Hydrologic Model..Finished",
+    "Writing Results..",
+]
+RESULT_FILE = "lower17.csv"
+RESULT_LOCATIONS = ("IPSWICH", "SAVAGES_XING", "MOGGILL")
+TIME_STEP_HOURS = 1.0
+
+
+def write_results(spec: dict, path: str) -> None:
+    """Write a gamma-shaped hydrograph per location, scaled by the AEP."""
+    duration = float(str(spec.get("duration") or "24").rstrip("h"))
+    aep = float(spec.get("aep") or 10)
+    rng = random.Random(json.dumps(spec, sort_keys=True, default=str))
+    steps = int((duration * 2) / TIME_STEP_HOURS) + 1
+    with open(path, "w") as f:
+        f.write("Time," + ",".join(f"{loc} (C)" for loc in RESULT_LOCATIONS) + "\n")
+        peaks = [rng.uniform(200, 400) * (1 + math.log10(aep)) * (i + 1) for i in range(len(RESULT_LOCATIONS))]
+        for step in range(steps):
+            t = step * TIME_STEP_HOURS
+            shape = (t / duration) ** 2 * math.exp(2 * (1 - t / duration)) if duration else 0.0
+            f.write(f"{t:.2f}," + ",".join(f"{peak * shape:.3f}" for peak in peaks) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("spec", nargs="?", help="job specification (JSON)")
+    parser.add_argument("--delay", type=float, default=float(os.environ.get("URBS_STUB_DELAY", 0.5)))
+    parser.add_argument("--fail", action="store_true")
+    args = parser.parse_args(argv)
+    spec = {}
+    if args.spec and os.path.exists(args.spec):
+        with open(args.spec) as f:
+            spec = json.load(f)
+
+    print(f"Use by   only: URBS Run dated {time.strftime('%a %b %d %H:%M:%S')}", flush=True)
+    for i, stage in enumerate(STAGES):
+        if args.fail and i == len(STAGES) // 2:
+            print("*** Error: simulated failure", flush=True)
+            return 1
+        print(stage, flush=True)
+        if stage.startswith("Writing Results"):
+            write_results(spec, RESULT_FILE)
+        time.sleep(args.delay)
+    print(f"Finished {time.strftime('%a %b %d %H:%M:%S')}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())